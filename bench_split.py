@@ -0,0 +1,46 @@
+# bench_split.py -- pelien jakamisen läpäisy (MB/s): vanha "\n\n"-jako vs GameSplitter
+#
+# Käyttö: python bench_split.py tiedosto.pgn [palan koko tavuina]
+
+import sys, time
+
+from pgnsplit import split_games
+
+CHUNK_SIZE = 32 * 1024  # vanhan load_zst_with_progressin lukukoko
+
+
+def legacy_split(chunks):
+    """Alkuperäinen load_zst_with_progress-silmukka"""
+    buffer = b""
+    for chunk in chunks:
+        buffer += chunk
+        while b"\n\n" in buffer:
+            game, buffer = buffer.split(b"\n\n", 1)
+            yield game
+    if buffer.strip():
+        yield buffer
+
+
+def new_split(chunks):
+    for _, game in split_games(chunks):
+        yield game
+
+
+def measure(name, splitter, data, chunk_size):
+    chunks = (data[i:i + chunk_size] for i in range(0, len(data), chunk_size))
+    t = time.perf_counter()
+    count = sum(1 for _ in splitter(chunks))
+    elapsed = time.perf_counter() - t
+    mb = len(data) / (1024 * 1024)
+    print(f"{name:8s} {count:9d} merkintää  {elapsed:8.3f} s  {mb / elapsed:8.1f} MB/s")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Käyttö: python bench_split.py tiedosto.pgn [palan koko]")
+        sys.exit(1)
+    with open(sys.argv[1], "rb") as f:
+        data = f.read()
+    chunk_size = int(sys.argv[2]) if len(sys.argv) > 2 else CHUNK_SIZE
+    measure("vanha", legacy_split, data, chunk_size)
+    measure("uusi", new_split, data, chunk_size)
@@ -0,0 +1,55 @@
+# boardhistory.py -- pelin asemat ilman täyttä lautakopiota joka puolisiirrolle
+#
+# Talletetaan siirrot ja joka SNAPSHOT_INTERVAL:s asema kopiona ilman
+# siirtopinoa (board.copy(stack=False)). Mikä tahansa asema saadaan
+# lähimmästä tilannekuvasta enintään SNAPSHOT_INTERVAL - 1 siirrolla, joten
+# hyppy mihin tahansa kohtaan peliä maksaa vakioajan pelin pituudesta riippumatta.
+
+import chess
+
+SNAPSHOT_INTERVAL = 16
+
+
+class BoardHistory:
+    """Pelin kaikki asemat: len() = puolisiirtoja + 1, board_at(ply) palauttaa uuden laudan"""
+
+    def __init__(self, moves=(), start=None, interval=SNAPSHOT_INTERVAL):
+        self.moves = []
+        self.interval = interval
+        board = start.copy(stack=False) if start is not None else chess.Board()
+        self._snapshots = [board.copy(stack=False)]
+        self._extend(board, moves)
+
+    def _extend(self, board, moves):
+        for move in moves:
+            board.push(move)
+            self.moves.append(move)
+            if len(self.moves) % self.interval == 0:
+                self._snapshots.append(board.copy(stack=False))
+
+    @classmethod
+    def from_san(cls, sans, start=None, interval=SNAPSHOT_INTERVAL):
+        """Rakentaa historian SAN-siirroista yhdellä läpikäynnillä"""
+        history = cls((), start, interval)
+        board = history._snapshots[0].copy(stack=False)
+        history._extend(board, (board.parse_san(san) for san in sans))
+        return history
+
+    def __len__(self):
+        return len(self.moves) + 1
+
+    def __getitem__(self, ply):
+        if ply < 0:
+            ply += len(self)
+        if not 0 <= ply < len(self):
+            raise IndexError("ply out of range")
+        return self.board_at(ply)
+
+    def board_at(self, ply):
+        """Asema ply puolisiirron jälkeen. Palautettavan laudan pinossa on vain tilannekuvan jälkeiset siirrot."""
+        ply = max(0, min(ply, len(self.moves)))
+        k = ply // self.interval
+        board = self._snapshots[k].copy(stack=False)
+        for move in self.moves[k * self.interval:ply]:
+            board.push(move)
+        return board
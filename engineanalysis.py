@@ -0,0 +1,180 @@
+# engineanalysis.py -- UCI-moottorin analyysi taustasäikeessä
+#
+# Moottori (oletuksena stockfish, ympäristömuuttuja PGNVIEWER_ENGINE) ajetaan
+# omana prosessinaan chess.engine.SimpleEngine-rajapinnan kautta. Taustasäie
+# analysoi aina uusimman pyydetyn aseman: uusi pyyntö pysäyttää käynnissä
+# olevan haun heti, joten Tk:n pääsilmukka ei koskaan odota moottoria.
+# Valmiit tulokset talletetaan FEN-kohtaiseen välimuistiin.
+#
+# Testaukseen käy fakeuci.py: PGNVIEWER_ENGINE="python fakeuci.py"
+
+import os, shlex, threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+
+import chess, chess.engine
+
+ENGINE_ENV = "PGNVIEWER_ENGINE"
+DEFAULT_ENGINE = "stockfish"
+ANALYSIS_TIME = 3.0      # sekuntia per asema
+CACHE_SIZE = 4096        # asemia
+PV_MOVES = 8
+
+
+def engine_command(command=None):
+    """Moottorin komento listana: annettu, ympäristömuuttuja tai stockfish"""
+    return shlex.split(command or os.environ.get(ENGINE_ENV) or DEFAULT_ENGINE)
+
+
+def format_score(score):
+    """PovScore -> "+0.35" tai "#-3" valkean näkökulmasta"""
+    white = score.white()
+    if white.is_mate():
+        return f"#{white.mate()}"
+    return f"{white.score() / 100:+.2f}"
+
+
+@dataclass(frozen=True)
+class EngineLine:
+    """Yhden aseman analyysi"""
+    score: str = ""
+    depth: int = 0
+    pv: str = ""
+    final: bool = False
+    error: Optional[str] = None
+
+    @classmethod
+    def from_info(cls, board, info, final=False):
+        pv = info.get("pv") or []
+        return cls(
+            score=format_score(info["score"]) if "score" in info else "",
+            depth=info.get("depth", 0),
+            pv=board.variation_san(pv[:PV_MOVES]) if pv else "",
+            final=final,
+        )
+
+    def __str__(self):
+        if self.error:
+            return self.error
+        return f"{self.score}  (syvyys {self.depth})  {self.pv}"
+
+
+class EngineAnalyzer:
+    """
+    Analysoi aina viimeisimmän analyse()-kutsun aseman. on_result(fen, EngineLine)
+    kutsutaan taustasäikeestä jokaisella välituloksella; virheestä fen on None.
+    """
+
+    def __init__(self, on_result, command=None, limit=None, cache_size=CACHE_SIZE):
+        self.command = engine_command(command)
+        self.limit = limit or chess.engine.Limit(time=ANALYSIS_TIME)
+        self.on_result = on_result
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._cond = threading.Condition()
+        self._board = None        # odottava pyyntö
+        self._analysis = None     # käynnissä oleva haku
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def cached(self, fen):
+        with self._cond:
+            line = self._cache.get(fen)
+            if line is not None:
+                self._cache.move_to_end(fen)
+            return line
+
+    def analyse(self, board):
+        """Pyytää aseman analyysin. Ei odota: tulos tulee on_result-kutsuna."""
+        fen = board.fen()
+        line = self.cached(fen)
+        with self._cond:
+            self._board = None if line is not None else board.copy(stack=False)
+            analysis = self._analysis
+            self._cond.notify()
+        if analysis is not None:
+            self._stop(analysis)
+        if line is not None:
+            self.on_result(fen, line)
+
+    def cancel(self):
+        """Pysäyttää käynnissä olevan haun"""
+        with self._cond:
+            self._board = None
+            analysis = self._analysis
+        if analysis is not None:
+            self._stop(analysis)
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._board = None
+            analysis = self._analysis
+            self._cond.notify()
+        if analysis is not None:
+            self._stop(analysis)
+
+    @staticmethod
+    def _stop(analysis):
+        try:
+            analysis.stop()
+        except Exception:
+            pass  # haku oli jo päättynyt tai moottori suljettu
+
+    def _store(self, fen, line):
+        with self._cond:
+            self._cache[fen] = line
+            self._cache.move_to_end(fen)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def _run(self):
+        try:
+            engine = chess.engine.SimpleEngine.popen_uci(self.command)
+        except Exception as e:
+            self.on_result(None, EngineLine(error=f"Moottoria ei voitu käynnistää: {e}"))
+            return
+        try:
+            while True:
+                with self._cond:
+                    while self._board is None and not self._closed:
+                        self._cond.wait()
+                    if self._closed:
+                        return
+                    board, self._board = self._board, None
+                self._search(engine, board)
+        except chess.engine.EngineError as e:
+            self.on_result(None, EngineLine(error=f"Moottorivirhe: {e}"))
+        except chess.engine.EngineTerminatedError:
+            self.on_result(None, EngineLine(error="Moottori pysähtyi"))
+        finally:
+            try:
+                engine.quit()
+            except Exception:
+                engine.close()
+
+    def _search(self, engine, board):
+        fen = board.fen()
+        analysis = engine.analysis(board, self.limit)
+        with self._cond:
+            self._analysis = analysis
+            stale = self._board is not None or self._closed
+        if stale:
+            self._stop(analysis)
+        last = None
+        try:
+            for info in analysis:
+                if "score" in info:
+                    last = info
+                    self.on_result(fen, EngineLine.from_info(board, info))
+        finally:
+            with self._cond:
+                self._analysis = None
+                stopped = self._board is not None or self._closed
+        # Vain loppuun asti ajettu haku kelpaa välimuistiin
+        if last is not None and not stopped:
+            line = EngineLine.from_info(board, last, final=True)
+            self._store(fen, line)
+            self.on_result(fen, line)
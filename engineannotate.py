@@ -0,0 +1,211 @@
+# engineannotate.py -- kokonaisen tiedoston asemien arviointi UCI-moottoreilla
+#
+# 1. Työprosessit jäsentävät pelit erissä (ingest.map_ordered), pelaavat
+#    päälinjan pelin alkuasemasta (FEN-tagi huomioiden) ja palauttavat
+#    jokaisen siirron jälkeisen aseman Zobrist-tiivisteen
+#    (positionindex.position_hash) ja FENin. Pääprosessi vain yhdistää erien
+#    asemat, joten yhteiset avaukset arvioidaan vain kerran.
+# 2. Asemat jaetaan usealle moottoriprosessille: jokaista moottoria ajaa oma
+#    säie, joka hakee seuraavan aseman yhteisestä jonosta.
+# 3. Jokainen arvio kirjoitetaan heti tarkistuspistetiedostoon
+#    (<tulos>.evals, rivi per asema). Keskeytetty ajo jatkuu siitä, mihin se
+#    jäi: jo arvioidut asemat luetaan tiedostosta eikä niitä lasketa uudelleen.
+# 4. Tulos on joko kommentoitu PGN ({ [%eval 0.35,12] } jokaisen siirron
+#    jälkeen) tai tiivis arviotaulu (.npy: tiiviste, arvio, syvyys).
+
+import io, os, queue, threading, time
+
+import numpy as np
+import chess, chess.engine, chess.pgn
+
+from engineanalysis import engine_command
+from ingest import iter_batches, map_ordered
+from pgnsplit import iter_file_games
+from positionindex import position_hash
+
+CHECKPOINT_SUFFIX = ".evals"
+DEFAULT_DEPTH = 12
+CHECKPOINT_EVERY = 100      # tarkistuspiste levylle tämän monen arvion välein
+MATE_SCORE = 32000          # matti n siirrossa -> ±(MATE_SCORE - n)
+EVAL_DTYPE = np.dtype([("hash", "<u8"), ("score", "<i2"), ("depth", "<u1")])
+
+
+def encode_score(score):
+    """PovScore -> kokonaisluku valkean näkökulmasta (sentit tai matti)"""
+    white = score.white()
+    if white.is_mate():
+        mate = white.mate()
+        return MATE_SCORE - mate if mate > 0 else -MATE_SCORE - mate
+    return max(-MATE_SCORE + 1000, min(MATE_SCORE - 1000, white.score()))
+
+
+def decode_score(value):
+    if abs(value) > MATE_SCORE - 1000:
+        mate = MATE_SCORE - value if value > 0 else -MATE_SCORE - value
+        return chess.engine.PovScore(chess.engine.Mate(mate), chess.WHITE)
+    return chess.engine.PovScore(chess.engine.Cp(value), chess.WHITE)
+
+
+def game_positions(raw, positions):
+    """
+    Lisää pelin (tavuina) päälinjan asemat positions-sanakirjaan {tiiviste: FEN}.
+    Palauttaa False, jos peliä ei voi jäsentää.
+    """
+    try:
+        game = chess.pgn.read_game(io.StringIO(raw.decode("utf-8", errors="ignore")))
+        board = game.board() if game is not None else None  # FEN-tagin alkuasema
+    except ValueError:
+        return False
+    if board is None:
+        return False
+    for move in game.mainline_moves():
+        board.push(move)
+        if not board.is_game_over():
+            positions.setdefault(position_hash(board), board.fen())
+    return True
+
+
+def _position_batch(batch):
+    """Työprosessi: erän pelit -> ({tiiviste: FEN}, jäsennettyjä pelejä)"""
+    positions = {}
+    games = sum(game_positions(raw, positions) for raw in batch)
+    return positions, games
+
+
+def collect_positions(path, processes=None):
+    """Tiedoston kaikkien pelien päälinjan asemat: {tiiviste: FEN}, sekä pelien määrä"""
+    positions = {}
+    games = 0
+    for batch_positions, batch_games in map_ordered(_position_batch, iter_batches(path), processes):
+        games += batch_games
+        for h, fen in batch_positions.items():
+            positions.setdefault(h, fen)
+    return positions, games
+
+
+def load_checkpoint(path):
+    """Tarkistuspisteen arviot: {tiiviste: (arvio, syvyys)}"""
+    evals = {}
+    try:
+        with open(path, encoding="ascii") as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) == 3:     # viimeinen rivi voi olla kesken
+                    evals[int(parts[0], 16)] = (int(parts[1]), int(parts[2]))
+    except FileNotFoundError:
+        pass
+    return evals
+
+
+def evaluate_positions(positions, evals, checkpoint, engines=None, limit=None, command=None, on_progress=None):
+    """
+    Arvioi asemat, joita ei vielä ole evals-sanakirjassa, engines moottorilla.
+    Jokainen arvio lisätään evalsiin ja kirjoitetaan checkpoint-tiedostoon.
+    on_progress(arvioitu, yhteensä) kutsutaan säikeistä.
+    """
+    engines = engines or os.cpu_count() or 1
+    limit = limit or chess.engine.Limit(depth=DEFAULT_DEPTH)
+    command = engine_command(command)
+    todo = queue.SimpleQueue()
+    total = 0
+    for h, fen in positions.items():
+        if h not in evals:
+            todo.put((h, fen))
+            total += 1
+    lock = threading.Lock()
+    errors = []
+    done = 0
+
+    def worker():
+        nonlocal done
+        try:
+            engine = chess.engine.SimpleEngine.popen_uci(command)
+        except Exception as e:
+            errors.append(e)
+            return
+        try:
+            while not errors:
+                try:
+                    h, fen = todo.get_nowait()
+                except queue.Empty:
+                    return
+                info = engine.analyse(chess.Board(fen), limit)
+                if "score" not in info:
+                    continue
+                value, depth = encode_score(info["score"]), min(info.get("depth", 0), 255)
+                with lock:
+                    evals[h] = (value, depth)
+                    checkpoint.write(f"{h:016x} {value} {depth}\n")
+                    done += 1
+                    if done % CHECKPOINT_EVERY == 0:
+                        checkpoint.flush()
+                    if on_progress:
+                        on_progress(done, total)
+        except chess.engine.EngineError as e:
+            errors.append(e)
+        finally:
+            engine.quit()
+
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(min(engines, max(total, 1)))]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    checkpoint.flush()
+    if errors:
+        raise errors[0]
+    return done
+
+
+def write_annotated_pgn(path, output, evals):
+    """Kirjoittaa tiedoston pelit arvioineen ({ [%eval ...] } siirtojen jälkeen)"""
+    with open(output, "w", encoding="utf-8") as out:
+        for _, raw in iter_file_games(path):
+            game = chess.pgn.read_game(io.StringIO(raw.decode("utf-8", errors="ignore")))
+            if game is None:
+                continue
+            board = game.board()
+            for node in game.mainline():
+                board.push(node.move)
+                found = evals.get(position_hash(board))
+                if found is not None:
+                    node.set_eval(decode_score(found[0]), found[1])
+            print(game, file=out, end="\n\n")
+
+
+def write_eval_table(output, evals):
+    """Tallentaa arviot tiivisteen mukaan järjestettynä .npy-taulukkona (EVAL_DTYPE)"""
+    table = np.empty(len(evals), dtype=EVAL_DTYPE)
+    table["hash"] = np.fromiter(evals.keys(), dtype=np.uint64, count=len(evals))
+    values = np.array(list(evals.values()), dtype=np.int64).reshape(-1, 2)
+    table["score"], table["depth"] = values[:, 0], values[:, 1]
+    table.sort(order="hash")
+    np.save(output, table)
+
+
+def annotate(path, output, engines=None, limit=None, command=None, processes=None, on_progress=None):
+    """
+    Arvioi tiedoston pelien asemat ja kirjoittaa tuloksen: .npy-päätteinen
+    output = arviotaulu, muuten kommentoitu PGN. Palauttaa tilastot sanakirjana.
+    """
+    start = time.perf_counter()
+    positions, games = collect_positions(path, processes)
+    checkpoint_path = output + CHECKPOINT_SUFFIX
+    evals = load_checkpoint(checkpoint_path)
+    resumed = sum(1 for h in positions if h in evals)
+    collected = time.perf_counter()
+    with open(checkpoint_path, "a", encoding="ascii") as checkpoint:
+        evaluated = evaluate_positions(positions, evals, checkpoint, engines, limit, command, on_progress)
+    analysed = time.perf_counter()
+    if output.endswith(".npy"):
+        write_eval_table(output, {h: evals[h] for h in positions if h in evals})
+    else:
+        write_annotated_pgn(path, output, evals)
+    return {
+        "games": games,
+        "positions": len(positions),
+        "resumed": resumed,
+        "evaluated": evaluated,
+        "positions_per_second": evaluated / max(analysed - collected, 1e-9),
+        "seconds": time.perf_counter() - start,
+    }
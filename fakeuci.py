@@ -0,0 +1,84 @@
+# fakeuci.py -- pieni UCI-moottorin korvike testaukseen ilman Stockfishia
+#
+#     PGNVIEWER_ENGINE="python fakeuci.py" python main.py
+#
+# Vastaa UCI-komentoihin: "go" tulostaa syvyys kerrallaan info-rivin
+# (arvio = materiaaliero sentteinä, muunnelmana ensimmäinen laillinen siirto)
+# ja lopuksi bestmoven. "stop" keskeyttää haun heti.
+
+import sys, threading, time
+
+import chess
+
+DEPTH_DELAY = 0.05      # sekuntia per syvyys
+MAX_DEPTH = 20
+_VALUES = {chess.PAWN: 100, chess.KNIGHT: 300, chess.BISHOP: 300, chess.ROOK: 500, chess.QUEEN: 900}
+
+
+def material(board):
+    score = 0
+    for piece_type, value in _VALUES.items():
+        score += value * (len(board.pieces(piece_type, chess.WHITE)) - len(board.pieces(piece_type, chess.BLACK)))
+    return score if board.turn == chess.WHITE else -score
+
+
+def send(line):
+    sys.stdout.write(line + "\n")
+    sys.stdout.flush()
+
+
+def search(board, stop, movetime, depth):
+    moves = list(board.legal_moves)
+    start = time.monotonic()
+    for d in range(1, depth + 1):
+        if stop.wait(DEPTH_DELAY):
+            break
+        if moves:
+            send(f"info depth {d} score cp {material(board)} nodes {d * 1000} pv {moves[0].uci()}")
+        if movetime is not None and time.monotonic() - start >= movetime:
+            break
+    send(f"bestmove {moves[0].uci() if moves else '0000'}")
+
+
+def main():
+    board = chess.Board()
+    worker, stop = None, threading.Event()
+    for line in sys.stdin:
+        parts = line.split()
+        if not parts:
+            continue
+        cmd = parts[0]
+        if cmd == "uci":
+            send("id name fakeuci")
+            send("uciok")
+        elif cmd == "isready":
+            send("readyok")
+        elif cmd == "position":
+            if parts[1] == "startpos":
+                board = chess.Board()
+                rest = parts[2:]
+            else:
+                board = chess.Board(" ".join(parts[2:8]))
+                rest = parts[8:]
+            for uci in rest[1:] if rest[:1] == ["moves"] else []:
+                board.push_uci(uci)
+        elif cmd == "go":
+            args = dict(zip(parts[1::2], parts[2::2]))
+            movetime = int(args["movetime"]) / 1000 if "movetime" in args else None
+            depth = int(args.get("depth", MAX_DEPTH))
+            if "infinite" in parts:
+                movetime, depth = None, 10 ** 6
+            stop = threading.Event()
+            worker = threading.Thread(target=search, args=(board.copy(), stop, movetime, depth))
+            worker.start()
+        elif cmd == "stop":
+            stop.set()
+            if worker is not None:
+                worker.join()
+        elif cmd == "quit":
+            stop.set()
+            break
+
+
+if __name__ == "__main__":
+    main()
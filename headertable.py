@@ -0,0 +1,254 @@
+# headertable.py -- pelien headerit sarakkeina NumPy-taulukoissa
+#
+# Jokaisesta tagista oma sarake: pelaajien nimet internoidaan kokonaisluvuiksi,
+# ECO-koodi on luku (A00 = 0 ... E99 = 499), tulos on pieni luku, päivämäärä
+# on päivän järjestysnumero (date.toordinal) ja Elo int16. Avauksen nimi ja
+# päivämäärä alkuperäisessä muodossaan ("2023.05.??") internoidaan samaan
+# nimitauluun, joten taulusta saa myös pelilistan esikatselun tagit (tag()).
+# Suodatus tehdään vektoroidusti koko taulukolle kerralla, esim.
+#
+#     table.filter("WhiteElo > 2500 and ECO in B90-B99 and Result = 0-1")
+#
+# Puuttuva arvo on sarakkeessa merkkiarvona (ECO -1, Elo ja päivä 0); ne
+# eivät osu suuruusvertailuihin eivätkä väleihin.
+
+import re
+from array import array
+from datetime import date
+
+import numpy as np
+
+RESULTS = ("*", "1-0", "0-1", "1/2-1/2")
+_RESULT_CODE = {r: i for i, r in enumerate(RESULTS)}
+_NAME_COLUMNS = {"White": "white", "Black": "black", "Event": "event", "Opening": "opening", "Date": "date_text"}
+_ELO_COLUMNS = {"WhiteElo": "white_elo", "BlackElo": "black_elo"}
+
+
+def eco_code(eco):
+    """"B90" -> 190, tuntematon -> -1"""
+    if eco and len(eco) == 3 and "A" <= eco[0] <= "E" and eco[1:].isdigit():
+        return (ord(eco[0]) - ord("A")) * 100 + int(eco[1:])
+    return -1
+
+
+def eco_text(code):
+    """190 -> "B90", -1 -> """""
+    return f"{'ABCDE'[code // 100]}{code % 100:02d}" if code >= 0 else ""
+
+
+def date_ordinal(value):
+    """"2023.05.??" -> date(2023, 5, 1).toordinal(), tuntematon -> 0"""
+    if not value:
+        return 0
+    parts = value.replace("-", ".").split(".")
+    try:
+        year = int(parts[0])
+    except ValueError:
+        return 0
+    nums = []
+    for p in parts[1:3]:
+        nums.append(int(p) if p.isdigit() else 1)
+    while len(nums) < 2:
+        nums.append(1)
+    try:
+        return date(year, nums[0] or 1, nums[1] or 1).toordinal()
+    except ValueError:
+        return 0
+
+
+def _elo(value):
+    return int(value) if value and value.isdigit() and int(value) < 32768 else 0
+
+
+def _tag(columns, names, i, tag):
+    """Rivin i tagin arvo sarakkeista merkkijonona (puuttuva -> "")"""
+    column = _NAME_COLUMNS.get(tag)
+    if column is not None:
+        return names[columns[column][i]]
+    column = _ELO_COLUMNS.get(tag)
+    if column is not None:
+        elo = int(columns[column][i])
+        return str(elo) if elo else ""
+    if tag == "ECO":
+        return eco_text(int(columns["eco"][i]))
+    if tag == "Result":
+        return RESULTS[columns["result"][i]]
+    return ""
+
+
+class HeaderTableBuilder:
+    """Kerää headerit riveittäin kompakteihin array-taulukoihin"""
+
+    def __init__(self):
+        self.names = {}          # nimi -> id (pelaajat, tapahtumat, avaukset ja päivät samassa taulussa)
+        self._names = []         # id -> nimi, jotta rivejä voi lukea jo rakennettaessa
+        self.columns = {
+            "white": array("i"), "black": array("i"), "event": array("i"),
+            "eco": array("h"), "result": array("b"), "date": array("i"),
+            "white_elo": array("h"), "black_elo": array("h"),
+            "opening": array("i"), "date_text": array("i"),
+        }
+
+    def __len__(self):
+        return len(self.columns["result"])
+
+    def _intern(self, name):
+        i = self.names.get(name)
+        if i is None:
+            i = self.names[name] = len(self._names)
+            self._names.append(name)
+        return i
+
+    def tag(self, i, name):
+        """Jo lisätyn rivin tagi (ks. HeaderTable.tag)"""
+        return _tag(self.columns, self._names, i, name)
+
+    def append(self, tags):
+        c = self.columns
+        c["white"].append(self._intern(tags.get("White", "?")))
+        c["black"].append(self._intern(tags.get("Black", "?")))
+        c["event"].append(self._intern(tags.get("Event", "?")))
+        c["eco"].append(eco_code(tags.get("ECO")))
+        c["result"].append(_RESULT_CODE.get(tags.get("Result", "*"), 0))
+        c["date"].append(date_ordinal(tags.get("Date")))
+        c["white_elo"].append(_elo(tags.get("WhiteElo")))
+        c["black_elo"].append(_elo(tags.get("BlackElo")))
+        c["opening"].append(self._intern(tags.get("Opening", "")))
+        c["date_text"].append(self._intern(tags.get("Date", "")))
+
+    def finish(self):
+        columns = {k: np.frombuffer(v, dtype=v.typecode).copy() for k, v in self.columns.items()}
+        return HeaderTable(columns, list(self._names))
+
+
+class HeaderTable:
+    """Sarakemuotoinen headeritaulu ja sen vektoroitu suodatus"""
+
+    def __init__(self, columns, names):
+        self.columns = columns
+        self.names = names
+        self._ids = {name: i for i, name in enumerate(names)}
+
+    def __len__(self):
+        return len(self.columns["result"])
+
+    def name_id(self, name):
+        return self._ids.get(name, -1)
+
+    def tag(self, i, name):
+        """Rivin i tagi merkkijonona: White, Black, Event, Opening, Date, ECO, Result, WhiteElo tai BlackElo"""
+        return _tag(self.columns, self.names, i, name)
+
+    def mask(self, expr):
+        """Totuusarvotaulukko riveistä, jotka täyttävät ehdon"""
+        result = np.ones(len(self), dtype=bool)
+        for field, op, value in parse_filter(expr):
+            result &= self._condition(field, op, value)
+        return result
+
+    def filter(self, expr):
+        """Ehdon täyttävien rivien (pelien) numerot"""
+        return np.flatnonzero(self.mask(expr))
+
+    def _condition(self, field, op, values):
+        # values on parse_filterin muuntama: nimet merkkijonoina, muut lukuina
+        if field in ("white", "black", "event"):
+            col, values = self.columns[field], [self.name_id(v) for v in values]
+        elif field == "player":
+            return (self._condition("white", op, values) | self._condition("black", op, values)
+                    if op != "!=" else
+                    self._condition("white", op, values) & self._condition("black", op, values))
+        elif field == "elo":
+            return (self._condition("white_elo", op, values) & self._condition("black_elo", op, values))
+        else:
+            col = self.columns[field]
+
+        if op == "in":
+            lo, hi = values
+            found = (col >= lo) & (col <= hi)
+        else:
+            v = values[0]
+            found = {"=": col == v, "!=": col != v, ">": col > v, ">=": col >= v,
+                     "<": col < v, "<=": col <= v}[op]
+        missing = _MISSING.get(field)
+        if missing is not None and op not in ("=", "!="):
+            found &= col != missing
+        return found
+
+
+# --- Suodatinlausekkeet ---
+
+_FIELDS = {
+    "white": "white", "black": "black", "event": "event", "player": "player",
+    "eco": "eco", "result": "result", "date": "date", "elo": "elo",
+    "whiteelo": "white_elo", "blackelo": "black_elo",
+}
+_MISSING = {"eco": -1, "date": 0, "white_elo": 0, "black_elo": 0}   # puuttuvan arvon merkki
+_CONDITION = re.compile(r'\s*(\w+)\s*(==|!=|>=|<=|=|>|<|\bin\b)\s*("[^"]*"|\S+)\s*', re.IGNORECASE)
+
+
+def _split_filter(expr):
+    """Lausekkeen ehdot (kenttä, operaattori, [arvot merkkijonoina]); vain syntaksi tarkistetaan"""
+    conditions = []
+    for part in re.split(r"\s+and\s+", expr.strip(), flags=re.IGNORECASE):
+        m = _CONDITION.fullmatch(part)
+        if not m or m.group(1).lower() not in _FIELDS:
+            raise ValueError(f"Tuntematon ehto: {part!r}")
+        field, op, value = _FIELDS[m.group(1).lower()], m.group(2).lower(), m.group(3).strip('"')
+        op = "=" if op == "==" else op
+        if op == "in":
+            if field not in ("eco", "date", "elo", "white_elo", "black_elo"):
+                raise ValueError(f"Väli ei käy kentälle: {part!r}")
+            lo, sep, hi = value.partition("-")
+            if not sep:
+                raise ValueError(f"Väli muodossa A-B: {part!r}")
+            conditions.append((field, op, [lo, hi]))
+        else:
+            conditions.append((field, op, [value]))
+    return conditions
+
+
+def _filter_value(field, value):
+    """Ehdon arvo sarakkeen muotoon; kelvoton arvo -> ValueError"""
+    if field in ("white", "black", "event", "player"):
+        return value
+    if field == "eco":
+        code = eco_code(value.upper())
+        if code < 0:
+            raise ValueError(f"Tuntematon ECO-koodi: {value!r}")
+        return code
+    if field == "result":
+        if value not in _RESULT_CODE:
+            raise ValueError(f"Tulos on yksi näistä: {', '.join(RESULTS)} (ei {value!r})")
+        return _RESULT_CODE[value]
+    if field == "date":
+        ordinal = date_ordinal(value)
+        if not ordinal:
+            raise ValueError(f"Tuntematon päivämäärä: {value!r}")
+        return ordinal
+    if not value.isdigit() or int(value) >= 32768:
+        raise ValueError(f"Elo on kokonaisluku: {value!r}")
+    return int(value)
+
+
+def parse_filter(expr):
+    """
+    "WhiteElo > 2500 and ECO in B90-B99 and Result = 0-1" ->
+    [("white_elo", ">", [2500]), ("eco", "in", [190, 199]), ("result", "=", [1])]
+    Arvot muunnetaan sarakkeiden muotoon (nimet jäävät merkkijonoiksi);
+    kelvoton arvo -> ValueError.
+    """
+    return [(field, op, [_filter_value(field, v) for v in values])
+            for field, op, values in _split_filter(expr)]
+
+
+def is_filter(expr):
+    """
+    Onko hakuteksti suodatinlauseke (eikä tavallinen tekstihaku). Vain
+    syntaksi tarkistetaan: kelvottomat arvot ilmoittaa parse_filter().
+    """
+    try:
+        _split_filter(expr)
+        return True
+    except ValueError:
+        return False
@@ -0,0 +1,75 @@
+# imagecache.py -- LRU-välimuisti piirretyille lautakuville
+#
+# Avain on (asema, käännetty, koko pikseleinä). Asemana käytetään nappuloiden
+# sijoittelua (board.board_fen()), koska kuva ei riipu siirtovuorosta tai
+# siirtolaskureista. Koko rajataan tavuina, ei kuvien määränä.
+
+import threading
+from collections import OrderedDict
+
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024  # 64 MB
+
+
+def board_key(board, flipped, size):
+    return board.board_fen(), flipped, size
+
+
+def image_nbytes(image):
+    return image.width * image.height * len(image.getbands())
+
+
+class BoardImageCache:
+    """Rajatun kokoinen LRU-välimuisti PIL-kuville"""
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._items)
+
+    def __contains__(self, key):
+        return key in self._items
+
+    def get(self, key):
+        with self._lock:
+            image = self._items.get(key)
+            if image is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return image
+
+    def put(self, key, image):
+        size = image_nbytes(image)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self.nbytes -= image_nbytes(old)
+            self._items[key] = image
+            self.nbytes += size
+            while self.nbytes > self.max_bytes:
+                _, evicted = self._items.popitem(last=False)
+                self.nbytes -= image_nbytes(evicted)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self.nbytes = 0
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "items": len(self._items),
+            "bytes": self.nbytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
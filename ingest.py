@@ -0,0 +1,86 @@
+# ingest.py -- rinnakkainen PGN-jäsennys suurille tiedostoille
+#
+# Pääprosessi lukee tiedoston (.pgn tai .zst), jakaa sen peleiksi ja kokoaa
+# pelit eriin. Työprosessit jäsentävät erät ChessGame-olioiksi ja tulokset
+# palautetaan alkuperäisessä järjestyksessä. Keskeneräisten erien määrää
+# rajoitetaan, joten muistinkäyttö ei kasva tiedoston koon mukana.
+#
+# headers_only=True ei käynnistä prosesseja lainkaan: pelit palautetaan
+# LazyChessGame-olioina, joiden tagit luetaan heti (pgnheaders.scan_headers)
+# ja siirtoteksti jäsennetään vasta, jos sitä käytetään.
+#
+# map_ordered() on yhteinen rinnakkaissilmukka: sitä käyttävät myös
+# mmappgn.scan_pgn, positionindex ja engineannotate.
+
+import os
+from collections import deque
+from multiprocessing import Pool
+
+from pgn_viewer2 import ChessGame, LazyChessGame
+from pgnheaders import scan_headers
+from pgnsplit import iter_file_games
+
+BATCH_SIZE = 500
+
+
+def map_ordered(func, items, processes=None, max_pending=None):
+    """
+    Generaattori: func(item) jokaiselle itemille processes prosessissa,
+    tulokset syötteen järjestyksessä. Keskeneräisiä tehtäviä on enintään
+    max_pending (oletus processes * 2), joten muisti ei kasva syötteen mukana.
+    func:n on oltava moduulitason funktio (pickle).
+    """
+    processes = processes or os.cpu_count() or 1
+    max_pending = max_pending or processes * 2
+    with Pool(processes) as pool:
+        pending = deque()
+        for item in items:
+            pending.append(pool.apply_async(func, (item,)))
+            if len(pending) >= max_pending:
+                yield pending.popleft().get()
+        while pending:
+            yield pending.popleft().get()
+
+
+def iter_batches(path, batch_size=BATCH_SIZE):
+    """Raakapelit (tavuina) batch_size kokoisina erinä"""
+    batch = []
+    for _, game in iter_file_games(path):
+        batch.append(game)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def parse_game(game):
+    """Yksi raakapeli -> ChessGame (virheellinen peli -> None)"""
+    try:
+        return ChessGame.from_pgn_string(game.decode("utf-8", errors="ignore"))
+    except ValueError:
+        return None
+
+
+def lazy_game(game):
+    """Yksi raakapeli -> LazyChessGame (tagit luettu, siirrot ei; ei tageja -> None)"""
+    tags = scan_headers(game)
+    return LazyChessGame(bytes(game), tags) if tags else None
+
+
+def parse_batch(batch):
+    return [parse_game(game) for game in batch]
+
+
+def ingest(path, processes=None, batch_size=BATCH_SIZE, headers_only=False):
+    """
+    Generaattori: jäsentää tiedoston pelit rinnakkain ja palauttaa ne
+    tiedoston järjestyksessä. Virheellisen pelin kohdalla palautetaan None.
+    headers_only=True: LazyChessGame-oliot ilman prosessipoolia.
+    """
+    if headers_only:
+        for _, game in iter_file_games(path):
+            yield lazy_game(game)
+        return
+    for games in map_ordered(parse_batch, iter_batches(path, batch_size), processes):
+        yield from games
@@ -4,11 +4,13 @@ from ui import PGNViewerWindow
 from pgn_viewer2 import ChessGame
 
 if __name__ == "__main__":
-    app = QApplication(sys.argv)
+    if len(sys.argv) < 2:
+        sys.exit("Käyttö: python main2.py tiedosto.pgn")
 
-    # Esimerkki: ladataan PGN-tiedosto
+    app = QApplication(sys.argv)
 
-    with open("/path/to/PGN-file") as f:
+    # Ladataan komentorivillä annettu PGN-tiedosto
+    with open(sys.argv[1], encoding="utf-8", errors="ignore") as f:
         pgn_text = f.read()
 
     game = ChessGame.from_pgn_string(pgn_text)
@@ -0,0 +1,79 @@
+# mmappgn.py -- pakkaamattoman PGN-tiedoston rinnakkainen luku mmap:lla
+#
+# Tiedosto jaetaan tavualueisiin, joiden rajat siirretään seuraavan
+# [Event -tagin alkuun, joten jokainen alue sisältää vain kokonaisia pelejä.
+# Työprosessit avaavat saman tiedoston omaan mmap:iinsa ja etsivät alueeltaan
+# pelien rajat ja headerit (pgnheaders.scan_chunk: yksi regex koko alueen yli).
+# Pelien tekstiä ei kopioida eikä dekoodata: pääprosessiin palautetaan vain
+# offsetit, pituudet ja tagit, ja pelin teksti luetaan pääprosessin
+# muistikuvasta memoryview-viipaleena (PgnIndex.game_view, pgncli.iter_games).
+#
+# Pelien jako on sama kuin pgnsplit.GameSplitterissä, joten pelien numerot
+# täsmäävät muiden hakemistojen (.pos, avauspuu) kanssa.
+
+import mmap, os
+
+from ingest import map_ordered
+from pgnheaders import scan_chunk
+from pgnsplit import EVENT_MARK
+
+RANGES_PER_PROCESS = 4
+MAX_RANGE_SIZE = 64 * 1024 * 1024     # alueen koko rajaa kerralla muistissa olevat tagit
+PARALLEL_MIN_SIZE = 16 * 1024 * 1024  # pienemmät tiedostot luetaan yhdessä prosessissa
+
+
+def open_mmap(path):
+    with open(path, "rb") as f:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def game_ranges(mm, parts):
+    """Jakaa tiedoston enintään parts alueeseen, joiden rajat ovat pelien alkuja"""
+    size = len(mm)
+    bounds = [0]
+    for k in range(1, parts):
+        i = mm.find(EVENT_MARK, max(bounds[-1], size * k // parts))
+        if i < 0:
+            break
+        if i + 1 > bounds[-1]:
+            bounds.append(i + 1)
+    bounds.append(size)
+    return list(zip(bounds, bounds[1:]))
+
+
+def scan_range(mm, start, end, wanted=None):
+    """Alueen pelit: (offsetit, pituudet, tagit). Alueen on alettava pelin alusta."""
+    return scan_chunk(mm, start, end, wanted)
+
+
+def _scan_worker(args):
+    path, start, end, wanted = args
+    mm = open_mmap(path)
+    try:
+        return scan_range(mm, start, end, wanted)
+    finally:
+        mm.close()
+
+
+def scan_pgn(path, processes=None, wanted=None):
+    """
+    Generaattori: tiedoston pelit alueittain järjestyksessä,
+    (offsetit, pituudet, tagit) jokaiselle alueelle.
+    """
+    if os.path.getsize(path) == 0:
+        return
+    processes = processes or os.cpu_count() or 1
+    mm = open_mmap(path)
+    try:
+        if len(mm) < PARALLEL_MIN_SIZE:
+            yield scan_range(mm, 0, len(mm), wanted)
+            return
+        ranges = game_ranges(mm, max(processes * RANGES_PER_PROCESS, len(mm) // MAX_RANGE_SIZE))
+        if processes == 1:
+            for start, end in ranges:
+                yield scan_range(mm, start, end, wanted)
+            return
+    finally:
+        mm.close()
+    # Keskeneräisiä alueita on enintään processes * 2, joten muisti ei kasva tiedoston mukana
+    yield from map_ordered(_scan_worker, ((path, start, end, wanted) for start, end in ranges), processes)
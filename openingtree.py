@@ -0,0 +1,235 @@
+# openingtree.py -- avauspuu: asema -> jatkosiirrot tilastoineen
+#
+# Jokaisen pelin TREE_PLIES ensimmäistä puolisiirtoa käydään läpi ja siirto
+# kirjataan sen aseman alle, josta se tehtiin (avaimena Zobrist-tiiviste,
+# sama kuin positionindex.py:ssä). Jokaiselle siirrolle lasketaan pelit,
+# valkean voitot, tasapelit, mustan voitot ja Elo-summa.
+#
+# Puu rakennetaan pyydettäessä (build_opening_tree) ja tallennetaan tiedoston
+# viereen (<tiedosto>.tree), kuten asemahakemisto. Työprosessit käyvät pelit
+# läpi erissä ja palauttavat erän tilastot valmiiksi koottuina taulukoina;
+# pääprosessi vain yhdistää ne NumPylla. Rivit (tiiviste, siirto) ovat
+# tiivisteen mukaan järjestettyjä, joten kysely on binäärihaku.
+#
+# Muistia rajoitetaan karsimalla: valmiista puusta jätetään pois siirrot,
+# joita on pelattu alle MIN_GAMES kertaa, ja jos puu kasvaa rakennuksen
+# aikana yli MAX_MOVES rivin, harvinaisimmat siirrot karsitaan jo silloin
+# (niiden myöhemmät pelit lasketaan alusta, joten harvinaisten siirtojen
+# määrät voivat jäädä hieman vajaiksi).
+#
+# Siirtoteksti luetaan suoraan SAN-merkeistä ilman chess.pgn:ää: kommentit,
+# muunnelmat ja NAGit poistetaan, ja siirrot pelataan laudalle.
+
+import os, re, zipfile
+
+import numpy as np
+import chess
+
+from ingest import iter_batches, map_ordered
+from pgnheaders import scan_header_span, scan_headers
+from positionindex import position_hash
+
+TREE_SUFFIX = ".tree"
+TREE_VERSION = 1
+TREE_PLIES = 20
+MIN_GAMES = 2                 # harvemmin pelatut siirrot jätetään pois
+MAX_MOVES = 2 * 1024 * 1024   # rivejä enintään rakennuksen aikana
+MERGE_ROWS = 1024 * 1024      # erien tilastot yhdistetään tämän välein
+GAMES, WHITE, DRAW, BLACK, ELO_SUM, ELO_GAMES = range(6)
+_RESULT_COLUMN = {"1-0": WHITE, "1/2-1/2": DRAW, "0-1": BLACK}
+_TREE_TAGS = frozenset(("Result", "WhiteElo", "BlackElo"))
+
+_COMMENT = re.compile(r"\{[^}]*\}|;[^\n]*")
+_VARIATION = re.compile(r"\([^()]*\)")
+_TOKEN = re.compile(r"[A-Za-z][A-Za-z0-9+#=\-]*")
+_RESULTS = frozenset(("1-0", "0-1", "1/2-1/2", "*"))
+
+
+def opening_tree_path(path):
+    return path + TREE_SUFFIX
+
+
+def mainline_sans(movetext, limit=None):
+    """Siirtotekstin päälinjan SAN-siirrot (enintään limit kpl)"""
+    text = _COMMENT.sub(" ", movetext)
+    while "(" in text:
+        text, n = _VARIATION.subn(" ", text)
+        if not n:
+            break
+    sans = [t for t in _TOKEN.findall(text) if t not in _RESULTS]
+    return sans[:limit] if limit is not None else sans
+
+
+def _elo(value):
+    return int(value) if value and value.isdigit() else 0
+
+
+def encode_move(move):
+    """chess.Move -> 16-bittinen koodi (lähtö, kohde, korotus)"""
+    return move.from_square | move.to_square << 6 | (move.promotion or 0) << 12
+
+
+def decode_move(code):
+    return chess.Move(code & 63, code >> 6 & 63, code >> 12 or None)
+
+
+def game_moves(game, plies=TREE_PLIES):
+    """
+    Pelin (tavuina) alun siirrot puuta varten: ([(tiiviste, siirtokoodi), ...],
+    tilastorivi). Muusta kuin vakioalkuasemasta alkava peli -> None.
+    """
+    header, start = scan_header_span(game, 0, ("FEN",))
+    if header:
+        return None
+    tags = scan_headers(game, _TREE_TAGS)
+    row = [1, 0, 0, 0, 0, 0]
+    column = _RESULT_COLUMN.get(tags.get("Result"))
+    if column is not None:
+        row[column] = 1
+    elos = [e for e in (_elo(tags.get("WhiteElo")), _elo(tags.get("BlackElo"))) if e]
+    if elos:
+        row[ELO_SUM] = sum(elos) // len(elos)
+        row[ELO_GAMES] = 1
+
+    board = chess.Board()
+    moves = []
+    for san in mainline_sans(game[start:].decode("utf-8", errors="ignore"), plies):
+        try:
+            move = board.parse_san(san)
+        except ValueError:
+            break
+        moves.append((position_hash(board), encode_move(move)))
+        board.push(move)
+    return moves, row
+
+
+def _combine(hashes, moves, stats):
+    """Samat (tiiviste, siirto) -rivit yhteen; tulos tiivisteen mukaan järjestettynä"""
+    if not len(hashes):
+        return hashes, moves, stats
+    order = np.lexsort((moves, hashes))
+    hashes, moves, stats = hashes[order], moves[order], stats[order]
+    first = np.ones(len(hashes), dtype=bool)
+    first[1:] = (hashes[1:] != hashes[:-1]) | (moves[1:] != moves[:-1])
+    starts = np.flatnonzero(first)
+    return hashes[starts], moves[starts], np.add.reduceat(stats, starts, axis=0)
+
+
+def _prune(hashes, moves, stats, min_games):
+    keep = stats[:, GAMES] >= min_games
+    return hashes[keep], moves[keep], stats[keep]
+
+
+def _tree_batch(args):
+    """Työprosessi: erän pelit -> (tiivisteet, siirrot, tilastot, pelejä)"""
+    batch, plies = args
+    hashes, moves, rows = [], [], []
+    for game in batch:
+        found = game_moves(game, plies)
+        if found is None:
+            continue
+        game_keys, row = found
+        for key, code in game_keys:
+            hashes.append(key)
+            moves.append(code)
+            rows.append(row)
+    part = _combine(np.array(hashes, dtype=np.uint64), np.array(moves, dtype=np.uint16),
+                    np.array(rows, dtype=np.int64).reshape(-1, 6))
+    return (*part, len(batch))
+
+
+def build_opening_tree(path, processes=None, on_progress=None, cancel=None,
+                       plies=TREE_PLIES, min_games=MIN_GAMES):
+    """
+    Rakentaa avauspuun ja tallentaa sen <tiedosto>.tree-sivutiedostoon.
+    on_progress(pelejä käsitelty) raportoi etenemisen. cancel(): jos se
+    palauttaa True, rakennus keskeytetään ja palautetaan None.
+    """
+    stamp = _source_stamp(path)
+    parts, rows, games = [], 0, 0
+    threshold = min_games
+    for *part, count in map_ordered(_tree_batch, ((batch, plies) for batch in iter_batches(path)),
+                                    processes):
+        if cancel and cancel():
+            return None
+        parts.append(part)
+        rows += len(part[0])
+        games += count
+        if rows >= MERGE_ROWS:
+            merged = _combine(*(np.concatenate(a) for a in zip(*parts)))
+            while len(merged[0]) > MAX_MOVES:
+                merged = _prune(*merged, threshold)
+                threshold *= 2
+            parts, rows = [merged], len(merged[0])
+        if on_progress:
+            on_progress(games)
+    if parts:
+        merged = _prune(*_combine(*(np.concatenate(a) for a in zip(*parts))), min_games)
+    else:
+        merged = (np.empty(0, np.uint64), np.empty(0, np.uint16), np.empty((0, 6), np.int64))
+    tree = OpeningTree(*merged, games=games, plies=plies)
+    try:
+        tree.save(opening_tree_path(path), stamp)
+    except OSError:
+        pass  # esim. kirjoitussuojattu hakemisto: puu jää vain muistiin
+    return tree
+
+
+def _source_stamp(path):
+    st = os.stat(path)
+    return st.st_size, st.st_mtime_ns
+
+
+class OpeningTree:
+    """(tiiviste, siirto) -> [pelit, 1-0, ½-½, 0-1, Elo-summa, Elo-pelit], tiivisteen mukaan järjestettynä"""
+
+    def __init__(self, hashes, moves, stats, games=0, plies=TREE_PLIES):
+        self.hashes = hashes
+        self.move_codes = moves
+        self.stats = stats
+        self.games = games
+        self.plies = plies
+
+    def __len__(self):
+        return len(self.hashes)
+
+    def save(self, filename, stamp):
+        tmp = filename + ".tmp"
+        with open(tmp, "wb") as f:
+            np.savez(f, header=np.array([TREE_VERSION, *stamp, self.games, self.plies], dtype=np.int64),
+                     hashes=self.hashes, moves=self.move_codes, stats=self.stats)
+        os.replace(tmp, filename)
+
+    def moves(self, board):
+        """
+        Aseman jatkot yleisimmästä alkaen:
+        [(san, pelit, valkea %, tasapeli %, musta %, keski-Elo tai None), ...]
+        """
+        h = np.uint64(position_hash(board))
+        lo = np.searchsorted(self.hashes, h, side="left")
+        hi = np.searchsorted(self.hashes, h, side="right")
+        rows = []
+        for code, stats in zip(self.move_codes[lo:hi].tolist(), self.stats[lo:hi].tolist()):
+            n = stats[GAMES]
+            move = decode_move(code)
+            san = board.san(move) if board.is_legal(move) else move.uci()
+            rows.append((
+                san, n,
+                100.0 * stats[WHITE] / n, 100.0 * stats[DRAW] / n, 100.0 * stats[BLACK] / n,
+                stats[ELO_SUM] // stats[ELO_GAMES] if stats[ELO_GAMES] else None,
+            ))
+        rows.sort(key=lambda r: -r[1])
+        return rows
+
+
+def open_opening_tree(path):
+    """Lataa <tiedosto>.tree, jos se on olemassa ja vastaa tiedostoa. Muuten None."""
+    try:
+        with np.load(opening_tree_path(path), allow_pickle=False) as data:
+            header = data["header"].tolist()
+            if header[:3] != [TREE_VERSION, *_source_stamp(path)]:
+                return None
+            return OpeningTree(data["hashes"], data["moves"], data["stats"],
+                               games=header[3], plies=header[4])
+    except (OSError, ValueError, KeyError, IndexError, EOFError, zipfile.BadZipFile):
+        return None
@@ -2,66 +2,64 @@ import os, io, threading
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox, scrolledtext
 
-import zstandard as zstd
+import numpy as np
 import chess, chess.pgn, chess.svg, cairosvg
 from PIL import Image, ImageTk
 
 from createtooltip import CreateToolTip
+from pgnindex import open_index
+from virtuallist import VirtualList
+from uiqueue import UiChannel
+from imagecache import BoardImageCache, board_key
+from spriteboard import SpriteBoardRenderer
+from boardhistory import BoardHistory
+from headertable import is_filter
+from textindex import SearchCursor
+from positionindex import build_position_index, open_position_index
+from openingtree import build_opening_tree, open_opening_tree
+from engineanalysis import EngineAnalyzer
+from prefetch import GamePrefetcher, PREFETCH_GAMES
 
 DEFAULT_PGN_DIR = "/path/to/files"
-CHUNK_SIZE = 32 * 1024  # 32 KB
+RESIZE_DELAY_MS = 150  # piirretään vasta kun koko ei ole muuttunut tähän aikaan
+SIZE_BUCKET = 32       # piirtokoot pyöristetään alaspäin tämän monikerraksi
+PREFETCH_DELAY_MS = 200   # esilataus alkaa, kun käyttäjä on ollut näin kauan paikallaan
+SINGLE_FRAME_WARN_SIZE = 64 * 1024 * 1024  # tätä suuremmasta yhden framen .zst:stä varoitetaan
+BOARD_RENDERER = "svg"  # "svg" = chess.svg + cairosvg joka asemalle, "sprite" = valmiit nappulakuvat (spriteboard.py)
 
 
-def load_zst_with_progress(path, progressbar, add_game_callback, on_done_callback=None):
+def load_index_with_progress(path, on_progress, add_game_callback, on_done_callback=None):
+    """Avaa tiedoston indeksin (.idx) tai rakentaa sen ensimmäisellä kerralla"""
     try:
         filesize = os.path.getsize(path)
-        progressbar.config(mode="determinate", maximum=filesize, value=0)
-
-        dctx = zstd.ZstdDecompressor()
-        total_read = 0
-        buffer = b""
-        with open(path, "rb") as f:
-            with dctx.stream_reader(f) as reader:
-                while True:
-                    chunk = reader.read(CHUNK_SIZE)
-                    if not chunk:
-                        break
-                    buffer += chunk
-                    total_read += len(chunk)
-
-                    while b"\n\n" in buffer:
-                        game, buffer = buffer.split(b"\n\n", 1)
-                        add_game_callback(game.decode("utf-8", errors="ignore"))
-
-                    progressbar.after(0, lambda tr=total_read: progressbar.config(value=tr))
-
-        if buffer.strip():
-            add_game_callback(buffer.decode("utf-8", errors="ignore"))
-
+        on_progress(0, filesize)
+        index = open_index(
+            path,
+            on_games=add_game_callback,
+            on_progress=lambda pos: on_progress(pos, filesize),
+        )
     except Exception as e:
         if on_done_callback:
             on_done_callback(error=e)
         return
 
     if on_done_callback:
-        on_done_callback()
-
-def stream_pgn(path):
-    game_lines = []
-    with open(path, "r", encoding="utf-8", errors="ignore") as f:
-        for line in f:
-            if line.strip() == "" and game_lines:
-                yield "".join(game_lines)
-                game_lines = []
-            else:
-                game_lines.append(line)
-    if game_lines:
-        yield "".join(game_lines)
+        on_done_callback(index=index)
 
-def svg_board_image_bytes(board, size=480):
-    svg = chess.svg.board(board=board, size=size)
+def snap_size(size):
+    """Pyöristää laudan koon SIZE_BUCKET-askeleeseen, jotta välimuistin kuvat kelpaavat uudelleen"""
+    return max(SIZE_BUCKET, size - size % SIZE_BUCKET)
+
+def svg_board_image_bytes(board, size=480, flipped=False):
+    svg = chess.svg.board(board=board, size=size, flipped=flipped)
     return cairosvg.svg2png(bytestring=svg.encode("utf-8"))
 
+def render_board_image(board, size=480, flipped=False):
+    """Piirtää laudan PIL-kuvaksi (SVG -> PNG -> Image)"""
+    image = Image.open(io.BytesIO(svg_board_image_bytes(board, size=size, flipped=flipped)))
+    image.load()
+    return image
+
 class PGNViewer:
     games: list
     current_index: int
@@ -69,7 +67,7 @@ class PGNViewer:
     game_moves: list
     current_move_index: int
     default_dir: str
-    stockfish_var: int
+    stockfish_var: tk.BooleanVar
 
     # board, photo
 
@@ -86,13 +84,30 @@ class PGNViewer:
 
         # Data
         self.games = []
-        self.current_index = 0
+        self.view = None          # suodatettujen pelien numerot (numpy), None = kaikki pelit
+        self.search_cursor = None
+        self.positions = None     # asemahakemisto (<tiedosto>.pos), rakennetaan pyydettäessä
+        self.tree = None          # avauspuu (<tiedosto>.tree), rakennetaan pyydettäessä
+        self.current_index = 0    # rivi pelilistassa
         self.filepath = ""
+        self.load_generation = 0  # kasvaa jokaisesta open_filesta; vanhan latauksen päivitykset ohitetaan
+        self.game_request = 0     # kasvaa jokaisesta valitusta pelistä; vanhat taustaluvut ohitetaan
+        self.game_loading = False # valittua peliä luetaan taustalla (ei esilatausta sillä välin)
         self.board = None
         self.game_moves = []
+        self.history = BoardHistory([])
         self.current_move_index = 0
         self.photo = None
-        self.stockfish_var = 0
+        self.board_image = None
+        self._draw_job = None
+        self._resize_job = None
+        self.flipped = False
+        self.image_cache = BoardImageCache()
+        # Viereiset pelit ja tulevat asemat valmiiksi taustalla (ks. prefetch.py)
+        self.prefetcher = GamePrefetcher(self.image_cache, None if BOARD_RENDERER == "sprite" else render_board_image)
+        self._prefetch_job = None
+        self.stockfish_var = tk.BooleanVar(value=False)
+        self.engine = None        # EngineAnalyzer, käynnissä kun Stockfish on valittu
 
         # --- Pääkehys ---
         main_frame = tk.Frame(root)
@@ -102,7 +117,7 @@ class PGNViewer:
         left = tk.Frame(main_frame)
         left.pack(side="left", fill="y", padx=4, pady=4)
         ttk.Label(left, text="Pelilista").pack(anchor="w")
-        self.game_list = tk.Listbox(left, width=40, height=30)
+        self.game_list = VirtualList(left, self._row_text, width=40, height=30)
         self.game_list.pack(fill="y", expand=False)
         self.game_list.bind("<<ListboxSelect>>", self.on_select_list)
         self.tooltip = CreateToolTip(self.game_list)
@@ -142,6 +157,7 @@ class PGNViewer:
         self.board_canvas = tk.Canvas(board_container, bg="#F0D9B5", highlightthickness=0)
         self.board_canvas.pack(fill="both", expand=True, padx=20, pady=20)  # 30 px ruskea reuna joka puolella
         self.board_canvas.bind("<Configure>", self.on_resize)
+        self.sprite_board = SpriteBoardRenderer(self.board_canvas)
 
         # Oikea osa = pelaajien nimet + siirtonapit (kiinteä leveys)
         side_panel = tk.Frame(board_frame, width=200)
@@ -174,42 +190,102 @@ class PGNViewer:
         self.last_move_btn = tk.Button(move_btns, text=">>", command=self.last_move, width=5)
         self.last_move_btn.pack(side="left", padx=2)
 
+        # Liukusäädin: hyppy mihin tahansa puolisiirtoon
+        self.move_slider = tk.Scale(move_btns, from_=0, to=0, orient="horizontal", showvalue=False,
+                                    command=self.on_slider)
+        self.move_slider.pack(side="left", fill="x", expand=True, padx=(20, 0))
+
+        # Näppäimet: nuolet selaavat siirtoja, Home/End alkuun/loppuun
+        root.bind("<Left>", lambda e: self._on_key(e, self.current_move_index - 1))
+        root.bind("<Right>", lambda e: self._on_key(e, self.current_move_index + 1))
+        root.bind("<Home>", lambda e: self._on_key(e, 0))
+        root.bind("<End>", lambda e: self._on_key(e, len(self.game_moves)))
+
 
         # 4. Loput pienet kontrollit & PGN-teksti
         bottom_frame = tk.Frame(right)
         bottom_frame.pack(fill="both", expand=False)
 
         tk.Button(bottom_frame, text="Avaa pgn tai zst", command=self.open_file).pack(side="left", padx=(0, 20))
-        tk.Radiobutton(bottom_frame, text="Stockfish", variable=self.stockfish_var, value=1).pack(side="left")
+        tk.Checkbutton(bottom_frame, text="Stockfish", variable=self.stockfish_var,
+                       command=self.toggle_engine).pack(side="left")
+        self.engine_label = tk.Label(bottom_frame, text="", font=("Consolas", 9), anchor="w")
+        self.engine_label.pack(side="left", fill="x", expand=True, padx=(10, 0))
 
         ttk.Label(right, text="Pelin PGN", font=("Arial", 10, "bold")).pack(anchor="w", pady=(20, 4))
         self.text = scrolledtext.ScrolledText(right, height=9, font=("Consolas", 9))
         self.text.pack(fill="both", expand=True, pady=(0, 10))
 
+        # Avauspuu: nykyisen aseman jatkot koko tiedostosta
+        tree_frame = tk.Frame(right)
+        tree_frame.pack(fill="x", pady=(0, 4))
+        ttk.Label(tree_frame, text="Avauspuu", font=("Arial", 10, "bold")).pack(side="left")
+        tk.Button(tree_frame, text="Rakenna", command=self.build_tree).pack(side="right")
+        columns = ("move", "games", "white", "draw", "black", "elo")
+        self.tree_view = ttk.Treeview(right, columns=columns, show="headings", height=6)
+        for col, title, width in zip(columns, ("Siirto", "Pelit", "1-0 %", "½ %", "0-1 %", "Elo"),
+                                     (70, 70, 60, 60, 60, 60)):
+            self.tree_view.heading(col, text=title)
+            self.tree_view.column(col, width=width, anchor="e" if col != "move" else "w")
+        self.tree_view.pack(fill="x", pady=(0, 10))
+
         # Haku
         search_frame = tk.Frame(right)
         search_frame.pack(fill="x", pady=4)
         ttk.Label(search_frame, text="Haku:").pack(side="left")
         self.search_entry = tk.Entry(search_frame)
         self.search_entry.pack(side="left", fill="x", expand=True, padx=8)
+        self.search_entry.bind("<Return>", lambda e: self.search_games())
+        tk.Button(search_frame, text="Edellinen", command=lambda: self.search_games(backwards=True)).pack(side="right")
+        tk.Button(search_frame, text="Seuraava", command=self.search_games).pack(side="right")
+        tk.Button(search_frame, text="Sama asema", command=self.same_position).pack(side="right", padx=(0, 8))
+        tk.Button(search_frame, text="Vie .zst", command=self.export_view).pack(side="right", padx=(0, 8))
 
         self.progress = ttk.Progressbar(right, mode="determinate")
         self.progress.pack(fill="x", pady=(0, 8))
 
+        # Taustasäikeiden päivitykset kulkevat tämän kautta pääsilmukkaan
+        self.ui = UiChannel(root)
+        self.ui.start()
+
+    def add_game(self, index, count):
+        # Lista hakee rivien tekstit indeksistä vasta kun ne näkyvät
+        self.games = index
+        if self.view is None:
+            self.game_list.set_count(count)
+
+    def game_id(self, row=None):
+        """Pelilistan rivi -> pelin numero tiedostossa"""
+        row = self.current_index if row is None else row
+        return row if self.view is None else int(self.view[row])
+
+    def row_count(self):
+        return len(self.games) if self.view is None else len(self.view)
+
+    def set_view(self, rows):
+        """Näyttää listassa vain annetut pelit (None = kaikki)"""
+        self.view = rows
+        self.search_cursor = None
+        self.game_list.clear()
+        self.game_list.set_count(self.row_count())
+        if self.row_count():
+            self.current_index = 0
+            self.game_list.select(0)
+            self.load_selected_game()
 
-    def add_game(self, game_text):
-        self.games.append(game_text)
-        preview = self._make_preview(game_text)
-        self.root.after(0, lambda: self.game_list.insert(tk.END, preview))
+    def set_progress(self, value, maximum):
+        self.progress.config(mode="determinate", maximum=maximum, value=value)
 
-    def _make_preview(self, game_text):
+    def _row_text(self, i):
+        return self._make_preview(self.games.game_tags(self.game_id(i)))
+
+    def _make_preview(self, tags):
         try:
-            lines = game_text.splitlines()
-            white = next((l.split('"')[1] for l in lines if l.startswith('[White ')), "?")
-            black = next((l.split('"')[1] for l in lines if l.startswith('[Black ')), "?")
-            res = next((l.split('"')[1] for l in lines if l.startswith('[Result ')), "")
-            eco = next((l.split('"')[1] for l in lines if l.startswith('[ECO ')), "")
-            opening = next((l.split('"')[1] for l in lines if l.startswith('[Opening ')), "")
+            white = tags.get("White", "?")
+            black = tags.get("Black", "?")
+            res = tags.get("Result", "")
+            eco = tags.get("ECO", "")
+            opening = tags.get("Opening", "")
 
             # UTF-8 lopputulosmerkki
             if res == "1-0":
@@ -225,7 +301,7 @@ class PGNViewer:
             return f"{result_symbol}  {white} — {black}"
 
         except Exception:
-            return game_text[:40] + "..."
+            return "?"
 
     def open_file(self):
         path = filedialog.askopenfilename(
@@ -235,130 +311,300 @@ class PGNViewer:
         if not path:
             return
 
-        self.game_list.delete(0, tk.END)
+        self.game_list.clear()
         self.text.delete("1.0", tk.END)
         self.games = []
+        self.view = None
+        self.search_cursor = None
+        self.positions = open_position_index(path)
+        self.prefetcher.clear()
+        self.game_loading = False
+        self.tree = open_opening_tree(path)
+        self.update_tree()
         self.current_index = 0
         self.filepath = path
+        self.load_generation += 1
+        generation = self.load_generation
         self.progress.pack(side="bottom", fill="x", pady=4)
 
-        if path.endswith(".zst"):
-            def on_done(error=None):
-                def finish():
-                    self.progress.pack_forget()
-                    if error:
-                        messagebox.showerror("Virhe", f"ZST-lataus epäonnistui: {error}")
-
-                self.root.after(0, finish)
-
-            t = threading.Thread(target=lambda: load_zst_with_progress(path, self.progress, self.add_game, on_done),
-                                 daemon=True)
-            t.start()
-        else:
-            def read_pgn():
-                try:
-                    for g in stream_pgn(path):
-                        self.add_game(g)
-                finally:
-                    self.root.after(0, lambda: self.progress.pack_forget())
-
+        # Edellisen tiedoston lataus voi vielä olla käynnissä: sen päivitykset ohitetaan
+        def current():
+            return generation == self.load_generation
+
+        def set_progress(value, maximum):
+            if current():
+                self.set_progress(value, maximum)
+
+        def add_game(index, count):
+            if current():
+                self.add_game(index, count)
+
+        def on_done(index=None, error=None):
+            def finish():
+                if not current():
+                    return
+                self.progress.pack_forget()
+                if error:
+                    messagebox.showerror("Virhe", f"Lataus epäonnistui: {error}")
+                    return
+                self.games = index
+                self.game_list.set_count(len(index))
+                if self.single_frame() and os.path.getsize(path) > SINGLE_FRAME_WARN_SIZE:
+                    messagebox.showwarning(
+                        "Yhden framen .zst",
+                        "Arkisto on pakattu yhdeksi frameksi, joten aiempaan peliin "
+                        "hyppääminen purkaa tiedoston alusta ja kaukana olevan pelin "
+                        "avaaminen voi kestää. Pakkaa tiedosto uudelleen hajasaantia varten:\n\n"
+                        f"python pgncli.py seekable {os.path.basename(path)} uusi.zst")
                 if self.games:
                     self.current_index = 0
-                    self.game_list.select_set(0)
+                    self.game_list.select(0)
                     self.load_selected_game()
 
-            threading.Thread(target=read_pgn, daemon=True).start()
+            self.ui.post(finish)
+
+        # Taustasäie ei kutsu widgettejä: pelimäärä ja edistyminen yhdistetään kanavassa
+        on_progress = lambda value, maximum: self.ui.set("progress", set_progress, value, maximum)
+        on_games = lambda index, count: self.ui.set("games", add_game, index, count)
+        t = threading.Thread(target=lambda: load_index_with_progress(path, on_progress, on_games, on_done),
+                             daemon=True)
+        t.start()
 
     def load_selected_game(self):
         if self.current_index is None:
             return
         self.board = chess.Board()
         self.game_moves = []
+        self.history = BoardHistory([])
         self.current_move_index = 0
 
+        # Pelin teksti haetaan levyltä vasta nyt, ellei esilataus ole jo jäsentänyt sitä.
+        # Yhden framen .zst:ssä luku voi purkaa tiedostoa pitkään: taustasäikeessä.
+        game_id = self.game_id()
+        parsed = self.prefetcher.cached(game_id)
+        self.game_request += 1
+        if parsed is None and self.single_frame():
+            # Esilataus korvaisi odottavan luvun, joten sitä ei ajeta ennen kuin peli näkyy
+            self.game_loading = True
+            request, games = self.game_request, self.games
+            self.text.delete("1.0", tk.END)
+            self.text.insert(tk.END, "Luetaan peliä...")
+            self.game_number_label.config(text=f"Peli {self.current_index + 1}/{self.row_count()}")
+            self.prefetcher.load(games, game_id, lambda parsed, error: self.ui.post(
+                self._game_loaded, request, games, game_id, parsed, error))
+            return
+        if parsed is None:
+            parsed = self.prefetcher.game(self.games, game_id)
+        self.show_game(game_id, parsed)
+
+    def _game_loaded(self, request, games, game_id, parsed, error):
+        if request != self.game_request or games is not self.games:
+            return  # käyttäjä valitsi jo toisen pelin tai tiedoston
+        self.game_loading = False
+        if error:
+            messagebox.showerror("Virhe", f"Pelin luku epäonnistui: {error}")
+            return
+        self.show_game(game_id, parsed)
+
+    def single_frame(self):
+        """Yhden framen .zst: hajasaanti taaksepäin purkaa tiedoston alusta (ks. zstseek.py)"""
+        return getattr(self.games, "is_zst", False) and len(self.games.frames) <= 1
+
+    def show_game(self, game_id, parsed):
+        """Näyttää jäsennetyn pelin: teksti, nimet, lauta ja siirtolista"""
+        self.game_loading = False
+        game_text = parsed.text
+
         # Tyhjennä ja täytä PGN-teksti
         self.text.delete("1.0", tk.END)
-        self.text.insert(tk.END, self.games[self.current_index])
+        self.text.insert(tk.END, game_text)
 
         # Päivitä pelin numero
-        self.game_number_label.config(text=f"Peli {self.current_index + 1}/{len(self.games)}")
+        self.game_number_label.config(text=f"Peli {self.current_index + 1}/{self.row_count()}")
 
         # Pelaajien nimet
         try:
-            lines = self.games[self.current_index].splitlines()
-            white = next((l.split('"')[1] for l in lines if l.startswith('[White ')), "?")
-            black = next((l.split('"')[1] for l in lines if l.startswith('[Black ')), "?")
+            white = self.games.tag(game_id, "White", "?")
+            black = self.games.tag(game_id, "Black", "?")
             self.white_label.config(text=f"White: {white}")
             self.black_label.config(text=f"Black: {black}")
         except Exception:
             self.white_label.config(text="White: ?")
             self.black_label.config(text="Black: ?")
 
-        try:
-            game = chess.pgn.read_game(io.StringIO(self.games[self.current_index]))
-            if game:
-                self.game_moves = list(game.mainline_moves())
-        except Exception:
-            self.game_moves = []
-
+        self.game_moves = parsed.moves
+        self.history = parsed.history
+        self.board = self.history.board_at(0)
+        self.move_slider.config(to=len(self.game_moves))
         self.update_move_number()
+        self.update_tree()
+        self.update_engine()
         self.draw_board()
+        self.schedule_prefetch()
+
+    def board_size(self):
+        return snap_size(min(self.board_canvas.winfo_width(), self.board_canvas.winfo_height()))
 
     def draw_board(self):
         if self.board is None:
             return
-        width = self.board_canvas.winfo_width()
-        height = self.board_canvas.winfo_height()
-        size = min(width, height)
-        png_bytes = svg_board_image_bytes(self.board, size=size)
-        image = Image.open(io.BytesIO(png_bytes))
+        size = self.board_size()
+        if BOARD_RENDERER == "sprite":
+            # Vain edellisestä asemasta muuttuneet ruudut piirretään uudelleen
+            self.sprite_board.draw(self.board, size, self.flipped)
+            return
+        key = board_key(self.board, self.flipped, size)
+        image = self.image_cache.get(key)
+        if image is None:
+            image = render_board_image(self.board, size=size, flipped=self.flipped)
+            self.image_cache.put(key, image)
+        self.board_image = image
         self.photo = ImageTk.PhotoImage(image)
         self.board_canvas.delete("all")
         self.board_canvas.create_image(0, 0, anchor="nw", image=self.photo)
 
     def on_resize(self, event):
+        # Ikkunaa raahatessa <Configure> tulee kymmeniä kertoja: piirretään vasta
+        # kun koko on pysynyt samana RESIZE_DELAY_MS, ja sitä ennen näytetään
+        # edellinen kuva skaalattuna
+        if self._resize_job is not None:
+            self.root.after_cancel(self._resize_job)
+        self._show_resize_preview(min(event.width, event.height))
+        self._resize_job = self.root.after(RESIZE_DELAY_MS, self._finish_resize)
+
+    def _show_resize_preview(self, size):
+        if BOARD_RENDERER == "sprite" or self.board_image is None or size < 8:
+            return
+        if size == self.board_image.width:
+            return
+        preview = self.board_image.resize((size, size), Image.NEAREST)
+        self.photo = ImageTk.PhotoImage(preview)
+        self.board_canvas.delete("all")
+        self.board_canvas.create_image(0, 0, anchor="nw", image=self.photo)
+
+    def _finish_resize(self):
+        self._resize_job = None
         self.draw_board()
 
-    def first_move(self):
+    def go_to_ply(self, ply, redraw=True):
+        """Siirtyy puolisiirtoon ply: viereiset push/pop, kauemmas lähimmästä tilannekuvasta"""
         if self.board is None:
             return
-        self.current_move_index = 0
-        self.board.reset()
+        ply = max(0, min(ply, len(self.game_moves)))
+        if ply == self.current_move_index:
+            return
+        if ply == self.current_move_index + 1:
+            self.board.push(self.game_moves[self.current_move_index])
+        elif ply == self.current_move_index - 1 and self.board.move_stack:
+            self.board.pop()
+        else:
+            self.board = self.history.board_at(ply)
+        self.current_move_index = ply
         self.update_move_number()
+        self.update_tree()
+        self.update_engine()
+        if redraw:
+            self.draw_board()
+        else:
+            self.schedule_draw()
+        self.schedule_prefetch()
+
+    def schedule_draw(self):
+        """Piirtää laudan kun tapahtumajono on tyhjä: näppäintoiston ja liukusäätimen
+        välipositiot yhdistyvät yhdeksi piirroksi"""
+        if self._draw_job is None:
+            self._draw_job = self.root.after_idle(self._scheduled_draw)
+
+    def _scheduled_draw(self):
+        self._draw_job = None
         self.draw_board()
 
-    def prev_move(self):
-        if self.board is None or self.current_move_index == 0:
+    def schedule_prefetch(self):
+        """Käynnistää esilatauksen, kun peliä tai siirtoa ei ole vaihdettu PREFETCH_DELAY_MS:iin"""
+        if self._prefetch_job is not None:
+            self.root.after_cancel(self._prefetch_job)
+        self._prefetch_job = self.root.after(PREFETCH_DELAY_MS, self._prefetch)
+
+    def _prefetch(self):
+        self._prefetch_job = None
+        if self.board is None or self.game_loading:
             return
-        self.current_move_index -= 1
-        self.board.reset()
-        for m in self.game_moves[:self.current_move_index]:
-            self.board.push(m)
-        self.update_move_number()
-        self.draw_board()
+        # Lähimmät ensin: +1, -1, +2, -2, ...
+        rows = []
+        for d in range(1, PREFETCH_GAMES + 1):
+            rows += [r for r in (self.current_index + d, self.current_index - d) if 0 <= r < self.row_count()]
+        ids = [self.game_id(r) for r in rows]
+        if self.single_frame():
+            # Yhden framen .zst: aiemman pelin luku purkaa tiedoston alusta saman
+            # lukijan lukon alla, jota pääsäie tarvitsee -> vain myöhemmät pelit
+            current = self.game_id()
+            ids = [i for i in ids if i > current]
+        self.prefetcher.request(self.games, ids, self.history,
+                                self.current_move_index, self.board_size(), self.flipped)
+
+    def first_move(self):
+        self.go_to_ply(0)
+
+    def prev_move(self):
+        self.go_to_ply(self.current_move_index - 1)
 
     def next_move(self):
-        if self.board is None or self.current_move_index >= len(self.game_moves):
-            return
-        self.board.push(self.game_moves[self.current_move_index])
-        self.current_move_index += 1
-        self.update_move_number()
-        self.draw_board()
+        self.go_to_ply(self.current_move_index + 1)
 
     def last_move(self):
-        if self.board is None:
+        self.go_to_ply(len(self.game_moves))
+
+    def on_slider(self, value):
+        # Tk kutsuu tätä myös set()-kutsun jälkeen; silloin arvo on jo nykyinen ply
+        self.go_to_ply(int(float(value)), redraw=False)
+
+    def _on_key(self, event, ply):
+        # Tekstikentissä nuolinäppäimet liikuttavat kursoria
+        if isinstance(event.widget, (tk.Entry, tk.Text)):
             return
-        self.current_move_index = len(self.game_moves)
-        self.board.reset()
-        for m in self.game_moves:
-            self.board.push(m)
-        self.update_move_number()
-        self.draw_board()
+        self.go_to_ply(ply, redraw=False)
 
     def update_move_number(self):
         move_num = (self.current_move_index + 1) // 2
         total_moves = max(1, len(self.game_moves) // 2)
         self.move_number_label.config(text=f"Siirto {move_num}/{total_moves}")
+        self.move_slider.set(self.current_move_index)
+
+    def toggle_engine(self):
+        if self.stockfish_var.get():
+            if self.engine is None:
+                # Tulokset tulevat taustasäikeestä: vain uusin näytetään
+                self.engine = EngineAnalyzer(lambda fen, line: self.ui.set("engine", self.show_engine, fen, line))
+            self.update_engine()
+        else:
+            if self.engine is not None:
+                self.engine.close()
+                self.engine = None
+            self.engine_label.config(text="")
+
+    def update_engine(self):
+        """Pyytää nykyisen aseman analyysin; edellinen haku keskeytetään"""
+        if self.engine is not None and self.board is not None:
+            self.engine.analyse(self.board)
+
+    def show_engine(self, fen, line):
+        if fen is None:
+            # Moottori ei käynnistynyt tai kaatui
+            self.stockfish_var.set(False)
+            self.toggle_engine()
+            self.engine_label.config(text=str(line))
+        elif self.board is not None and fen == self.board.fen():
+            self.engine_label.config(text=str(line))
+
+    def update_tree(self):
+        """Täyttää avauspuun nykyisen aseman jatkoilla (yksi sanakirjahaku)"""
+        self.tree_view.delete(*self.tree_view.get_children())
+        if self.board is None or self.tree is None:
+            return
+        for san, games, white, draw, black, elo in self.tree.moves(self.board):
+            self.tree_view.insert("", "end", values=(
+                san, games, f"{white:.0f}", f"{draw:.0f}", f"{black:.0f}", elo if elo is not None else "",
+            ))
 
     def on_select_list(self, event=None):
         sel = self.game_list.curselection()
@@ -368,50 +614,188 @@ class PGNViewer:
         self.load_selected_game()
         # Päivitä tooltip
         try:
-            lines = self.games[self.current_index].splitlines()
-            eco = next((l.split('"')[1] for l in lines if l.startswith('[ECO ')), "")
-            opening = next((l.split('"')[1] for l in lines if l.startswith('[Opening ')), "")
+            eco = self.games.tag(self.game_id(), "ECO")
+            opening = self.games.tag(self.game_id(), "Opening")
             self.tooltip.text = f"ECO: {eco}\nOpening: {opening}"
         except Exception:
             self.tooltip.text = ""
 
     def first_game(self):
-        if self.games:
+        if self.row_count():
             self.current_index = 0
-            self.game_list.select_clear(0, tk.END)
-            self.game_list.select_set(self.current_index)
+            self.game_list.select(self.current_index)
             self.load_selected_game()
 
     def prev_game(self):
-        if self.games and self.current_index > 0:
+        if self.row_count() and self.current_index > 0:
             self.current_index -= 1
-            self.game_list.select_clear(0, tk.END)
-            self.game_list.select_set(self.current_index)
+            self.game_list.select(self.current_index)
             self.load_selected_game()
 
     def next_game(self):
-        if self.games and self.current_index < len(self.games) - 1:
+        if self.current_index < self.row_count() - 1:
             self.current_index += 1
-            self.game_list.select_clear(0, tk.END)
-            self.game_list.select_set(self.current_index)
+            self.game_list.select(self.current_index)
             self.load_selected_game()
 
     def last_game(self):
-        if self.games:
-            self.current_index = len(self.games) - 1
-            self.game_list.select_clear(0, tk.END)
-            self.game_list.select_set(self.current_index)
+        if self.row_count():
+            self.current_index = self.row_count() - 1
+            self.game_list.select(self.current_index)
             self.load_selected_game()
 
-    def search_games(self):
-        query = self.search_entry.get().lower().strip()
+    def search_games(self, backwards=False):
+        query = self.search_entry.get().strip()
         if not query:
+            if self.view is not None:
+                self.set_view(None)
+            return
+
+        # Suodatin, esim. "WhiteElo > 2500 and ECO in B90-B99 and Result = 0-1"
+        table = getattr(self.games, "table", None)
+        if table is not None and is_filter(query):
+            try:
+                rows = table.filter(query)
+            except ValueError as e:
+                messagebox.showerror("Haku", str(e))
+                return
+            if len(rows) == 0:
+                messagebox.showinfo("Haku", "Ei osumia.")
+                return
+            self.set_view(rows)
             return
-        for i, g in enumerate(self.games):
-            if query in g.lower():
+
+        # Nimihaku käänteisestä hakemistosta; sama haku uudelleen = seuraava osuma
+        text = getattr(self.games, "text", None)
+        if text is not None:
+            if self.search_cursor is None or self.search_cursor.query != query:
+                hits = text.search(query)
+                if self.view is not None:
+                    hits = np.intersect1d(hits, self.view)
+                self.search_cursor = SearchCursor(query, hits)
+            game = self.search_cursor.prev() if backwards else self.search_cursor.next()
+            if game is None:
+                messagebox.showinfo("Haku", "Ei osumia.")
+                return
+            self.current_index = game if self.view is None else int(np.searchsorted(self.view, game))
+            self.game_list.select(self.current_index)
+            self.load_selected_game()
+            return
+
+        # Indeksi on vielä kesken: hidas tekstihaku
+        query = query.lower()
+        for i in range(self.row_count()):
+            if query in self.games[self.game_id(i)].lower():
                 self.current_index = i
-                self.game_list.select_clear(0, tk.END)
-                self.game_list.select_set(i)
+                self.game_list.select(i)
                 self.load_selected_game()
                 return
         messagebox.showinfo("Haku", "Ei osumia.")
+
+    def same_position(self):
+        """Näyttää listassa pelit, joissa laudan nykyinen asema esiintyi"""
+        if self.board is None or not self.filepath:
+            return
+        if self.positions is None:
+            if messagebox.askyesno("Asemahaku", "Asemahakemistoa ei ole. Rakennetaanko se nyt?"):
+                self.build_positions()
+            return
+        games = self.positions.games(self.board)
+        if self.view is not None:
+            games = np.intersect1d(games, self.view)
+        if len(games) == 0:
+            messagebox.showinfo("Asemahaku", "Ei osumia.")
+            return
+        self.set_view(games)
+
+    def build_positions(self):
+        path = self.filepath
+        total = len(self.games)
+        self.progress.pack(side="bottom", fill="x", pady=4)
+
+        def on_progress(count):
+            self.ui.set("progress", self.set_progress, count, max(total, count, 1))
+
+        def finish(positions=None, error=None):
+            self.progress.pack_forget()
+            if error:
+                messagebox.showerror("Virhe", f"Asemahakemiston rakennus epäonnistui: {error}")
+            elif path == self.filepath:
+                self.positions = positions
+                self.same_position()
+
+        def run():
+            try:
+                positions = build_position_index(path, on_progress=on_progress)
+            except Exception as e:
+                self.ui.post(finish, None, e)
+                return
+            self.ui.post(finish, positions)
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def build_tree(self):
+        """Rakentaa avauspuun taustalla; keskeytyy, jos toinen tiedosto avataan"""
+        path = self.filepath
+        if not path:
+            return
+        total = len(self.games)
+        self.progress.pack(side="bottom", fill="x", pady=4)
+
+        def on_progress(count):
+            self.ui.set("progress", self.set_progress, count, max(total, count, 1))
+
+        def finish(tree=None, error=None):
+            if path != self.filepath:
+                return  # toinen tiedosto avattu: sen lataus käyttää edistymispalkkia
+            self.progress.pack_forget()
+            if error:
+                messagebox.showerror("Virhe", f"Avauspuun rakennus epäonnistui: {error}")
+            elif tree is not None:
+                self.tree = tree
+                self.update_tree()
+
+        def run():
+            try:
+                tree = build_opening_tree(path, on_progress=on_progress,
+                                          cancel=lambda: path != self.filepath)
+            except Exception as e:
+                self.ui.post(finish, None, e)
+                return
+            self.ui.post(finish, tree)
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def export_view(self):
+        """Tallentaa listassa näkyvät pelit uuteen .zst-tiedostoon (monen framen, hajasaanti)"""
+        if not self.row_count() or not hasattr(self.games, "export"):
+            return
+        dst = filedialog.asksaveasfilename(
+            initialdir=self.default_dir, defaultextension=".zst",
+            filetypes=[("ZST files", "*.zst")]
+        )
+        if not dst:
+            return
+        games = self.games
+        ids = np.arange(len(games)) if self.view is None else self.view
+        self.progress.config(mode="indeterminate")
+        self.progress.pack(side="bottom", fill="x", pady=4)
+        self.progress.start()
+
+        def finish(error=None):
+            self.progress.stop()
+            self.progress.pack_forget()
+            if error:
+                messagebox.showerror("Virhe", f"Vienti epäonnistui: {error}")
+            else:
+                messagebox.showinfo("Vienti", f"{len(ids)} peliä tallennettu: {dst}")
+
+        def run():
+            try:
+                games.export(ids, dst)
+            except Exception as e:
+                self.ui.post(finish, e)
+                return
+            self.ui.post(finish)
+
+        threading.Thread(target=run, daemon=True).start()
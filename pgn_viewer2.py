@@ -7,6 +7,9 @@ from typing import List, Optional, Dict
 import chess  # python-chess kirjasto (pip install chess)
 import chess.pgn
 
+from boardhistory import BoardHistory
+from pgnheaders import scan_headers
+
 class Result(Enum):
     WHITE_WINS = "1-0"
     BLACK_WINS = "0-1"
@@ -53,25 +56,25 @@ class ChessGame:
     """Yksi kokonainen shakkipeli"""
     headers: GameHeaders
     moves: List[str] = field(default_factory=list)        # SAN-siirrot: ["e4", "e5", ...]
-    board_history: List[chess.Board] = field(default_factory=list)  # jokainen asema
+    board_history: BoardHistory = field(default_factory=BoardHistory)  # jokainen asema (harvat tilannekuvat)
     comments: Dict[int, str] = field(default_factory=dict)  # puolinumero -> kommentti
+    start_fen: Optional[str] = None                         # FEN-tagin alkuasema, None = normaali alkuasema
 
     def __post_init__(self) -> None:
         # Ladataan peli chess.pgn:stä tai rakennetaan käsin
         self._build_board_history()
 
     def _build_board_history(self) -> None:
-        board = chess.Board()
-        self.board_history = [board.copy()]
-
-        for move_san in self.moves:
-            move = board.parse_san(move_san)
-            board.push(move)
-            self.board_history.append(board.copy())
+        # Täysi lautakopio joka puolisiirrolle vie muistia neliöllisesti (jokaisessa
+        # kopiossa on oma siirtopinonsa); BoardHistory pitää vain siirrot ja harvat tilannekuvat
+        start = chess.Board(self.start_fen) if self.start_fen else None
+        self.board_history = BoardHistory.from_san(self.moves, start=start)
 
     def current_board(self, ply: int = -1) -> chess.Board:
         """Palauttaa laudan annetulla vuorolla (ply = puolinumero, -1 = viimeisin)"""
-        return self.board_history[max(0, min(ply, len(self.board_history) - 1))]
+        if ply < 0:
+            ply += len(self.board_history)
+        return self.board_history.board_at(ply)
 
     @classmethod
     def from_pgn_string(cls, pgn: str) -> "ChessGame":
@@ -80,31 +83,7 @@ class ChessGame:
         if game is None:
             raise ValueError("Virheellinen PGN")
 
-        headers = game.headers
-
-        white = Player(
-            name=headers.get("White", "?"),
-            elo=_parse_elo(headers.get("WhiteElo")),
-            title=headers.get("WhiteTitle")
-        )
-        black = Player(
-            name=headers.get("Black", "?"),
-            elo=_parse_elo(headers.get("BlackElo")),
-            title=headers.get("BlackTitle")
-        )
-
-        game_headers = GameHeaders(
-            event=headers.get("Event", "?"),
-            site=headers.get("Site", "?"),
-            date=_parse_date(headers.get("Date")),
-            round=headers.get("Round", "?"),
-            white=white,
-            black=black,
-            result=Result(headers.get("Result", "*")),
-            eco=headers.get("ECO"),
-            opening=headers.get("Opening"),
-            variation=headers.get("Variation")
-        )
+        game_headers = headers_from_tags(game.headers)
 
         moves = []
         node = game
@@ -126,11 +105,106 @@ class ChessGame:
                 moves.append("")
             node = next_node
 
-        return cls(headers=game_headers, moves=moves)
+        start_fen = game.board().fen() if "FEN" in game.headers else None
+        return cls(headers=game_headers, moves=moves, start_fen=start_fen)
+
+
+class LazyChessGame:
+    """
+    Peli, jonka tagit luetaan heti mutta GameHeaders, siirrot (SAN) ja
+    asemahistoria rakennetaan vasta ensimmäisellä käyttökerralla. Sama
+    rajapinta kuin ChessGame-luokalla (headers, moves, board_history,
+    current_board), mutta vain headereita tarvitseva käsittely ei koskaan
+    jäsennä siirtotekstiä.
+    """
+    __slots__ = ("pgn", "tags", "_headers", "_moves", "_history")
+
+    def __init__(self, pgn: bytes, tags: Optional[Dict[str, str]] = None) -> None:
+        self.pgn = pgn
+        if tags is None:
+            tags = scan_headers(pgn)
+            if not tags:
+                raise ValueError("Virheellinen PGN")
+        self.tags = tags
+        self._headers = None
+        self._moves = None
+        self._history = None
+
+    @property
+    def text(self) -> str:
+        return self.pgn.decode("utf-8", errors="ignore")
+
+    @property
+    def headers(self) -> GameHeaders:
+        if self._headers is None:
+            self._headers = headers_from_tags(self.tags)
+        return self._headers
+
+    @property
+    def board_history(self) -> BoardHistory:
+        if self._history is None:
+            game = chess.pgn.read_game(io.StringIO(self.text))
+            if game is None:
+                raise ValueError("Virheellinen PGN")
+            self._history = BoardHistory(game.mainline_moves(), start=game.board())
+        return self._history
+
+    @property
+    def moves(self) -> List[str]:
+        if self._moves is None:
+            history = self.board_history
+            board = history.board_at(0)
+            sans = []
+            for move in history.moves:
+                sans.append(board.san(move))
+                board.push(move)
+            self._moves = sans
+        return self._moves
+
+    @property
+    def comments(self) -> Dict[int, str]:
+        return {}
+
+    def current_board(self, ply: int = -1) -> chess.Board:
+        """Palauttaa laudan annetulla vuorolla (ply = puolinumero, -1 = viimeisin)"""
+        if ply < 0:
+            ply += len(self.board_history)
+        return self.board_history.board_at(ply)
+
+    def materialize(self) -> ChessGame:
+        """Täysi ChessGame-olio (jäsentää siirrot, jos sitä ei ole vielä tehty)"""
+        start_fen = self.board_history.board_at(0).fen() if "FEN" in self.tags else None
+        return ChessGame(headers=self.headers, moves=list(self.moves), start_fen=start_fen)
 
 
 # Apufunktiot
 import io
+def headers_from_tags(headers) -> GameHeaders:
+    """Rakentaa GameHeaders-olion tagisanakirjasta (esim. chess.pgn.Headers)"""
+    white = Player(
+        name=headers.get("White", "?"),
+        elo=_parse_elo(headers.get("WhiteElo")),
+        title=headers.get("WhiteTitle")
+    )
+    black = Player(
+        name=headers.get("Black", "?"),
+        elo=_parse_elo(headers.get("BlackElo")),
+        title=headers.get("BlackTitle")
+    )
+
+    return GameHeaders(
+        event=headers.get("Event", "?"),
+        site=headers.get("Site", "?"),
+        date=_parse_date(headers.get("Date")),
+        round=headers.get("Round", "?"),
+        white=white,
+        black=black,
+        result=Result(headers.get("Result", "*")),
+        eco=headers.get("ECO"),
+        opening=headers.get("Opening"),
+        variation=headers.get("Variation")
+    )
+
 def _parse_elo(elo_str: Optional[str]) -> Optional[int]:
     if not elo_str or elo_str == "?":
         return None
@@ -0,0 +1,321 @@
+# pgncli.py -- komentorivityökalu suurille .pgn- ja .zst-tiedostoille ilman käyttöliittymää
+#
+#     python pgncli.py count lichess.pgn.zst
+#     python pgncli.py filter lichess.pgn.zst "WhiteElo > 2500 and ECO in B90-B99" -o najdorf.zst
+#     python pgncli.py extract lichess.pgn.zst 1 100-110
+#     python pgncli.py stats lichess.pgn.zst --moves
+#     python pgncli.py selo kerho.pgn --months 3 -o selo.csv
+#     python pgncli.py annotate kerho.pgn -o kerho-eval.pgn --depth 14 --engines 8
+#     python pgncli.py seekable lichess.pgn.zst lichess.seek.zst
+#
+# Tiedosto käydään läpi virtana, joten muistinkäyttö ei riipu tiedoston koosta.
+# Pakkaamaton .pgn luetaan rinnakkain (mmappgn.py), monen framen .zst puretaan
+# rinnakkain (zstseek.py) ja --moves jäsentää pelit prosessipoolissa (ingest.py).
+# Läpäisy tulostetaan stderr:iin.
+
+import argparse, csv, os, sys, time
+from collections import Counter
+
+import chess.engine
+
+from engineannotate import annotate
+from headertable import HeaderTableBuilder, RESULTS, parse_filter
+from ingest import ingest
+from mmappgn import open_mmap, scan_pgn
+from pgnheaders import scan_chunk
+from pgnindex import INDEX_TAGS, open_index
+from pgnsplit import iter_file_blocks, iter_file_games
+from selopgn import rate_file
+from zstseek import FRAME_SIZE, make_seekable, write_seekable
+
+FILTER_TAGS = frozenset(INDEX_TAGS + ("Event",))
+FILTER_BATCH = 10000
+
+
+class Meter:
+    """Laskee pelit ja tavut ja tulostaa läpäisyn"""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.games = 0
+        self.bytes = 0
+
+    def add(self, nbytes):
+        self.games += 1
+        self.bytes += nbytes
+
+    def report(self, label=""):
+        elapsed = max(time.perf_counter() - self.start, 1e-9)
+        mb = self.bytes / (1024 * 1024)
+        if self.bytes:
+            print(f"{label}{self.games} peliä, {mb:.1f} MB, {elapsed:.1f} s "
+                  f"({mb / elapsed:.1f} MB/s, {self.games / elapsed:.0f} peliä/s)", file=sys.stderr)
+        else:
+            print(f"{label}{self.games} peliä, {elapsed:.1f} s ({self.games / elapsed:.0f} peliä/s)",
+                  file=sys.stderr)
+
+
+def iter_games(path, wanted=None, processes=None):
+    """Tiedoston pelit: (pelin tavut tai memoryview, tagit)"""
+    if path.endswith(".zst"):
+        for _, block in iter_file_blocks(path):
+            offsets, lengths, tags = scan_chunk(block, 0, len(block), wanted)
+            for offset, length, game_tags in zip(offsets, lengths, tags):
+                yield block[offset:offset + length], game_tags
+        return
+    # Pakkaamattoman tiedoston pelit memoryview-viipaleina muistikuvaan (ei kopiota)
+    view = memoryview(open_mmap(path)) if os.path.getsize(path) else None
+    for offsets, lengths, tags in scan_pgn(path, processes, wanted):
+        for offset, length, game_tags in zip(offsets, lengths, tags):
+            yield view[offset:offset + length], game_tags
+
+
+def open_output(name):
+    if not name or name == "-":
+        return sys.stdout.buffer
+    return open(name, "wb")
+
+
+def write_games(games, output, processes=None):
+    """Kirjoittaa pelit tiedostoon: .zst monen framen arkistoksi, muuten sellaisenaan"""
+    if output and output.endswith(".zst"):
+        write_seekable(games, output, threads=processes)
+        return
+    out = open_output(output)
+    try:
+        for game in games:
+            out.write(game)
+            if game[-1:] != b"\n":
+                out.write(b"\n\n")
+    finally:
+        if out is not sys.stdout.buffer:
+            out.close()
+
+
+def cmd_count(args):
+    meter = Meter()
+    if args.file.endswith(".zst"):
+        for _, game in iter_file_games(args.file):
+            meter.add(len(game))
+    else:
+        for _, lengths, _ in scan_pgn(args.file, args.processes, ()):
+            meter.games += len(lengths)
+            meter.bytes += sum(lengths)
+    print(meter.games)
+    meter.report()
+
+
+def cmd_filter(args):
+    meter = Meter()
+    matched = 0
+
+    def matching():
+        nonlocal matched
+        batch, tables = [], HeaderTableBuilder()
+        for game, tags in iter_games(args.file, FILTER_TAGS, args.processes):
+            meter.add(len(game))
+            batch.append(game)
+            tables.append(tags)
+            if len(batch) >= FILTER_BATCH:
+                for i in tables.finish().filter(args.expr):
+                    matched += 1
+                    yield batch[i]
+                batch, tables = [], HeaderTableBuilder()
+        if batch:
+            for i in tables.finish().filter(args.expr):
+                matched += 1
+                yield batch[i]
+
+    write_games(matching(), args.output, args.processes)
+    meter.report(f"{matched} osumaa / ")
+
+
+def _parse_ranges(specs, count):
+    """["3", "10-12"] -> [2, 9, 10, 11] (1-pohjaiset numerot, kuten katselimessa)"""
+    ids = []
+    for spec in specs:
+        lo, sep, hi = spec.partition("-")
+        lo, hi = int(lo), int(hi) if sep else int(lo)
+        if not 1 <= lo <= hi <= count:
+            raise SystemExit(f"Peliä {spec} ei ole (pelejä {count})")
+        ids.extend(range(lo - 1, hi))
+    return ids
+
+
+def cmd_extract(args):
+    def on_progress(pos):
+        print(f"\rIndeksoidaan... {pos / (1024 * 1024):.0f} MB", end="", file=sys.stderr)
+
+    index = open_index(args.file, on_progress=on_progress)
+    print(file=sys.stderr)
+    meter = Meter()
+
+    def games():
+        for i in _parse_ranges(args.games, len(index)):
+            game = index.game_view(i)
+            meter.add(len(game))
+            yield game
+
+    write_games(games(), args.output, args.processes)
+    meter.report()
+
+
+def cmd_stats(args):
+    meter = Meter()
+    results, ecos = Counter(), Counter()
+    elo_sum = elo_count = 0
+    dates = []
+    for game, tags in iter_games(args.file, FILTER_TAGS, args.processes):
+        meter.add(len(game))
+        results[tags.get("Result", "*")] += 1
+        ecos[tags.get("ECO", "?")] += 1
+        for tag in ("WhiteElo", "BlackElo"):
+            value = tags.get(tag, "")
+            if value.isdigit():
+                elo_sum += int(value)
+                elo_count += 1
+        date = tags.get("Date", "")
+        if date[:4].isdigit():
+            dates = [min(dates[0], date), max(dates[1], date)] if dates else [date, date]
+
+    total = meter.games or 1
+    print(f"Pelejä: {meter.games}")
+    for result in RESULTS[1:] + RESULTS[:1]:
+        print(f"  {result:8} {results[result]:10} ({100.0 * results[result] / total:.1f} %)")
+    if elo_count:
+        print(f"Keski-Elo: {elo_sum / elo_count:.0f}")
+    if dates:
+        print(f"Päivämäärät: {dates[0]} - {dates[1]}")
+    print("Yleisimmät ECO-koodit: " + ", ".join(f"{eco} {n}" for eco, n in ecos.most_common(10)))
+    meter.report()
+
+    if args.moves:
+        # Siirrot jäsennetään ChessGame-olioiksi prosessipoolissa
+        meter = Meter()
+        plies, longest, errors = 0, 0, 0
+        for game in ingest(args.file, args.processes):
+            if game is None:
+                errors += 1
+                continue
+            meter.add(0)
+            plies += len(game.moves)
+            longest = max(longest, len(game.moves))
+        print(f"Puolisiirtoja keskimäärin: {plies / max(meter.games, 1):.1f}, pisin peli: {longest}")
+        if errors:
+            print(f"Virheellisiä pelejä: {errors}")
+        meter.report("Jäsennetty: ")
+
+
+def cmd_selo(args):
+    meter = Meter()
+    results, pipeline = rate_file(args.file, args.processes, period_months=args.months,
+                                  chronological=args.chronological)
+    out = open(args.output, "w", newline="", encoding="utf-8") if args.output else sys.stdout
+    try:
+        writer = csv.writer(out)
+        writer.writerow(("name", "selo", "games"))
+        writer.writerows(results)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    meter.games = pipeline.added + pipeline.skipped + pipeline.late
+    if pipeline.skipped or pipeline.late:
+        print(f"Ohitettu {pipeline.skipped} peliä (tulos, päivä tai pelaajat puuttuu), "
+              f"{pipeline.late} aikajärjestyksestä poikkeavaa", file=sys.stderr)
+    meter.report(f"{len(results)} pelaajaa / ")
+
+
+def cmd_annotate(args):
+    if args.time:
+        limit = chess.engine.Limit(time=args.time)
+    else:
+        limit = chess.engine.Limit(depth=args.depth)
+    start = time.perf_counter()
+
+    def on_progress(done, total):
+        if done % 100 == 0 or done == total:
+            rate = done / max(time.perf_counter() - start, 1e-9)
+            print(f"\r{done}/{total} asemaa ({rate:.0f} asemaa/s)", end="", file=sys.stderr)
+
+    stats = annotate(args.file, args.output, args.engines, limit, args.engine, args.processes, on_progress)
+    print(file=sys.stderr)
+    print(f"{stats['games']} peliä, {stats['positions']} eri asemaa, {stats['resumed']} tarkistuspisteestä, "
+          f"{stats['evaluated']} arvioitu ({stats['positions_per_second']:.1f} asemaa/s), "
+          f"{stats['seconds']:.1f} s", file=sys.stderr)
+
+
+def cmd_seekable(args):
+    start = time.perf_counter()
+    frames = make_seekable(args.file, args.output, args.frame_size * 1024 * 1024, args.level, args.processes)
+    mb_in, mb_out = os.path.getsize(args.file) / (1024 * 1024), os.path.getsize(args.output) / (1024 * 1024)
+    print(f"{len(frames)} framea, {mb_in:.1f} MB -> {mb_out:.1f} MB, {time.perf_counter() - start:.1f} s",
+          file=sys.stderr)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="pgncli", description="PGN- ja ZST-tiedostojen käsittely komentoriviltä")
+    parser.add_argument("-j", "--processes", type=int, default=None,
+                        help="rinnakkaisten prosessien/säikeiden määrä (oletus: kaikki ytimet)")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("count", help="laske pelit")
+    p.add_argument("file")
+    p.set_defaults(func=cmd_count)
+
+    p = sub.add_parser("filter", help="suodata pelit headerien perusteella")
+    p.add_argument("file")
+    p.add_argument("expr", help='esim. "WhiteElo > 2500 and ECO in B90-B99 and Result = 0-1"')
+    p.add_argument("-o", "--output", help="tulostiedosto (.pgn tai .zst), oletus stdout")
+    p.set_defaults(func=cmd_filter)
+
+    p = sub.add_parser("extract", help="poimi pelit numeroiden perusteella (1-pohjainen, esim. 5 10-20)")
+    p.add_argument("file")
+    p.add_argument("games", nargs="+")
+    p.add_argument("-o", "--output", help="tulostiedosto (.pgn tai .zst), oletus stdout")
+    p.set_defaults(func=cmd_extract)
+
+    p = sub.add_parser("stats", help="tilastot headereista")
+    p.add_argument("file")
+    p.add_argument("--moves", action="store_true", help="jäsennä myös siirrot (hitaampi)")
+    p.set_defaults(func=cmd_stats)
+
+    p = sub.add_parser("selo", help="laske pelaajien SELO-luvut headereista (CSV)")
+    p.add_argument("file")
+    p.add_argument("--months", type=int, default=1, help="arviointijakson pituus kuukausina")
+    p.add_argument("--chronological", action="store_true",
+                   help="tiedosto on aikajärjestyksessä: jaksot lasketaan heti (vähemmän muistia)")
+    p.add_argument("-o", "--output", help="CSV-tiedosto, oletus stdout")
+    p.set_defaults(func=cmd_selo)
+
+    p = sub.add_parser("annotate", help="arvioi kaikki asemat UCI-moottoreilla (jatkuu keskeytyksestä)")
+    p.add_argument("file")
+    p.add_argument("-o", "--output", required=True, help="kommentoitu .pgn tai arviotaulu .npy")
+    p.add_argument("--engine", help="moottorin komento (oletus PGNVIEWER_ENGINE tai stockfish)")
+    p.add_argument("--engines", type=int, default=None, help="moottoriprosessien määrä (oletus: ytimet)")
+    p.add_argument("--depth", type=int, default=12, help="hakusyvyys")
+    p.add_argument("--time", type=float, default=None, help="aika per asema sekunteina (korvaa syvyyden)")
+    p.set_defaults(func=cmd_annotate)
+
+    p = sub.add_parser("seekable", help="pakkaa .zst tai .pgn uudelleen pieniksi frameiksi (nopea hajasaanti)")
+    p.add_argument("file")
+    p.add_argument("output", help="uusi .zst-tiedosto")
+    p.add_argument("--frame-size", type=int, default=FRAME_SIZE // (1024 * 1024), help="purettua dataa per frame (MB)")
+    p.add_argument("--level", type=int, default=3, help="zstd-pakkaustaso")
+    p.set_defaults(func=cmd_seekable)
+
+    args = parser.parse_args(argv)
+    if args.command == "filter":
+        try:
+            parse_filter(args.expr)
+        except ValueError as e:
+            parser.error(str(e))
+    try:
+        args.func(args)
+    except BrokenPipeError:
+        # Esim. "| head" sulki tulosteen kesken
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+# pgnheaders.py -- nopea PGN-tagien luku ilman chess.pgn:ää
+#
+# Tagiosio (tyhjään riviin asti) puretaan kerralla merkkijonoksi ja tagit
+# poimitaan yhdellä findall-kutsulla. Escapeja sisältävät tai epätavallisesti
+# muotoillut headerit luetaan rivi kerrallaan. Kummassakin tapauksessa luku
+# pysähtyy siirtotekstiin, joten sitä ei käsitellä lainkaan.
+#
+# Massaluvussa (scan_chunk) koko alueen yli ajetaan yksi tavu-regex, joka
+# poimii jokaisen tavallisen headerin kerralla ja hyppää siirtotekstin yli
+# C-tasolla. Headerit dekoodataan yhtenä merkkijonona ja jaetaan tageiksi
+# str.split-kutsuilla, joten Python-tason työtä on vain muutama kutsu peliä
+# kohden. Alueen ensimmäinen peli ja epätavalliset headerit (escapet,
+# ylimääräiset välilyönnit, useita tageja rivillä) luetaan
+# scan_header_span()-funktiolla.
+
+import re
+from array import array
+
+from pgnsplit import EVENT_MARK, iter_file_blocks
+
+_TAG = re.compile(rb'\s*\[([A-Za-z0-9_]+)\s+"((?:[^"\\]|\\.)*)"\s*\]')
+_FAST_TAG = re.compile(r'\[([A-Za-z0-9_]+) "([^"\\]*)"\]')
+_ESCAPE = re.compile(rb'\\(.)')
+_BOM = b"\xef\xbb\xbf"   # UTF-8 BOM tiedoston alussa (Windows- ja ChessBase-viennit)
+# Tavallisen pelin koko headeri yhdellä osumalla: "\n[Event " ja perään vain
+# [Nimi "arvo"] -rivejä (ilman escapeja) tyhjään riviin asti. Muuten ryhmä jää
+# tyhjäksi, ja peli luetaan scan_header_span()-funktiolla.
+_GAME_HEADER = re.compile(
+    rb'\n\[Event (?:("[^"\\\n]*"\](?:\r?\n\[(?!Event )[A-Za-z0-9_]+ "[^"\\\n]*"\])*)\r?\n(?=[ \t]*\r?\n))?')
+
+
+def _value(raw):
+    if b"\\" in raw:
+        raw = _ESCAPE.sub(rb"\1", raw)
+    return raw.decode("utf-8", errors="ignore")
+
+
+def scan_header_span(data, pos=0, wanted=None):
+    """
+    Lukee tagit kohdasta pos alkaen. Palauttaa (tagit, siirtotekstin alku).
+    Jos wanted on annettu (joukko tagien nimiä), muut tagit ohitetaan.
+    """
+    if data[pos:pos + 3] == _BOM:
+        pos += 3
+    while pos < len(data) and data[pos] in b" \t\r\n":
+        pos += 1
+    end = data.find(b"\n\n", pos)
+    if end >= 0:
+        text = data[pos:end].decode("utf-8", errors="ignore")
+        pairs = _FAST_TAG.findall(text)
+        # Nopea polku kelpaa, kun jokainen rivi on yksi tavallinen tagi
+        if text.startswith("[") and "\\" not in text and len(pairs) == text.count("\n") + 1:
+            if wanted is None:
+                return dict(pairs), end + 1
+            return {k: v for k, v in pairs if k in wanted}, end + 1
+    return _scan_lines(data, pos, end, wanted)
+
+
+def _scan_lines(data, pos, end, wanted):
+    block = data[pos:end if end >= 0 else len(data)]
+    tags = {}
+    for line in block.split(b"\n"):
+        stripped = line.rstrip()
+        if stripped[:1] != b"[":
+            break
+        name, sep, value = stripped[1:-2].partition(b' "')
+        if sep and stripped.endswith(b'"]') and b" " not in name and b"\\" not in value and b'"' not in value:
+            name = name.decode("ascii", errors="ignore")
+            if wanted is None or name in wanted:
+                tags[name] = value.decode("utf-8", errors="ignore")
+        else:
+            # Harvinainen muoto: escapet tai useita tageja rivillä
+            m = _TAG.match(stripped)
+            if not m:
+                break
+            while m:
+                name = m.group(1).decode("ascii")
+                if wanted is None or name in wanted:
+                    tags[name] = _value(m.group(2))
+                m = _TAG.match(stripped, m.end())
+        pos += len(line) + 1
+    return tags, min(pos, len(data))
+
+
+def _header_copy(data, start, stop):
+    """Pelin headerit (tyhjään riviin asti) omaksi tavujonokseen"""
+    head = start + 3 if data[start:start + 3] == _BOM else start
+    while head < stop and data[head] in b" \t\r\n":
+        head += 1
+    header_end = data.find(b"\n\n", head, stop)
+    return data[head:header_end + 2 if header_end >= 0 else stop]
+
+
+def scan_chunk(data, start=0, end=None, wanted=None):
+    """
+    Jakaa alueen data[start:end] peleiksi (sama jako kuin pgnsplit) ja lukee
+    kaikkien pelien tagit. Alueen on alettava pelin alusta; data voi olla
+    bytes tai mmap. Palauttaa (offsetit, pituudet, tagit).
+    """
+    end = len(data) if end is None else end
+    offsets, lengths = array("Q"), array("I")
+    pos = start
+    while pos < end:
+        i = data.find(EVENT_MARK, pos, end)
+        stop = i + 1 if i >= 0 else end
+        if pos > 0 or data[pos:stop].strip():
+            offsets.append(pos)
+            lengths.append(stop - pos)
+        pos = stop
+    n = len(offsets)
+    tags = [None] * n
+    if n > 1:
+        # Pelit 1..n-1 alkavat "\n[Event " -rajan jälkeen: yksi osuma peliä kohden
+        blocks = _GAME_HEADER.findall(data, offsets[1] - 1, end)
+        text = b"\0".join(blocks).decode("utf-8", errors="ignore")
+        if "\r" in text:
+            text = text.replace("\r\n", "\n")
+        blocks = text.split("\0")
+        if len(blocks) == n - 1:    # muuten esim. NUL-tavu arvossa: kaikki hitaasti
+            _fill_tags(tags, blocks, wanted)
+    for g in range(n):
+        if tags[g] is None:
+            tags[g] = scan_header_span(_header_copy(data, offsets[g], offsets[g] + lengths[g]), 0, wanted)[0]
+    return offsets, lengths, tags
+
+
+def _fill_tags(tags, blocks, wanted):
+    """
+    Headerit '"arvo"]\n[Nimi "arvo"]...' -> tags[1:]. Lainausmerkeistä jaettuna
+    parittomat palat ovat arvoja ja parilliset ']\n[Nimi ', joten halutut tagit
+    haetaan näillä valmiiksi muodostetuilla avaimilla.
+    """
+    event = wanted is None or "Event" in wanted
+    keys = [(name, "]\n[" + name + " ") for name in wanted if name != "Event"] if wanted is not None else None
+    for g, block in enumerate(blocks, 1):
+        if not block:
+            continue
+        parts = block.split('"')
+        if keys is None:
+            found = {key[3:-1]: value for key, value in zip(parts[2::2], parts[3::2])}
+        else:
+            fields = dict(zip(parts[2::2], parts[3::2]))
+            found = {name: fields[key] for name, key in keys if key in fields}
+        if event:
+            found["Event"] = parts[1]
+        tags[g] = found
+
+
+def scan_headers(data, wanted=None):
+    """Pelin tagit sanakirjana {"White": "...", ...}"""
+    return scan_header_span(data, 0, wanted)[0]
+
+
+def scan_game_headers(data):
+    """Pelin tagit GameHeaders-oliona"""
+    from pgn_viewer2 import headers_from_tags
+    return headers_from_tags(scan_headers(data))
+
+
+def iter_file_headers(path, wanted=None, processes=None):
+    """
+    Tiedoston (.pgn tai .zst) kaikkien pelien tagit: (offset, tagit).
+    Pakkaamaton .pgn luetaan rinnakkain processes prosessilla (ks. mmappgn.py).
+    """
+    if not path.endswith(".zst"):
+        from mmappgn import scan_pgn
+        for offsets, _, tags in scan_pgn(path, processes, wanted):
+            yield from zip(offsets, tags)
+        return
+    for base, block in iter_file_blocks(path):
+        offsets, _, tags = scan_chunk(block, 0, len(block), wanted)
+        for offset, game_tags in zip(offsets, tags):
+            yield base + offset, game_tags
@@ -0,0 +1,230 @@
+# pgnindex.py -- pelien tavuoffset-indeksi .pgn- ja .zst-tiedostoille
+#
+# Ensimmäisellä avauskerralla tiedosto luetaan kerran läpi ja jokaisen pelin
+# alkukohta, pituus ja tärkeimmät tagit tallennetaan tiedoston viereen
+# (<tiedosto>.idx). Seuraavilla kerroilla indeksi ladataan suoraan ja pelin
+# teksti haetaan levyltä vasta, kun peli valitaan.
+#
+# .zst-tiedostoissa offsetit ovat puretun datan offsetteja. Lisäksi talletetaan
+# framien alkukohdat (pakattu offset, purettu offset), joista purku voidaan
+# aloittaa keskeltä tiedostoa (ks. zstseek.py).
+#
+# Tagit ovat vain HeaderTablen sarakkeissa (internoidut nimet). Sivutiedosto
+# on pelkkiä NumPy-taulukoita (.npz, allow_pickle=False): merkkijonot on
+# talletettu yhtenä UTF-8-tekstinä ja sen katkaisukohtina, joten lataus ei
+# aja tiedostosta mitään koodia eikä luo olioita peliä kohden.
+
+import os, zipfile
+from array import array
+
+import numpy as np
+
+from headertable import HeaderTable, HeaderTableBuilder
+from mmappgn import open_mmap, scan_pgn
+from pgnheaders import scan_chunk
+from pgnsplit import split_blocks
+from textindex import TextIndex, TextIndexBuilder
+from zstseek import iter_zst_frames, write_seekable, ZstSeekableReader
+
+INDEX_VERSION = 4
+INDEX_SUFFIX = ".idx"
+INDEX_TAGS = ("White", "Black", "Result", "ECO", "Opening", "Date", "WhiteElo", "BlackElo")
+_WANTED = frozenset(INDEX_TAGS + ("Event", "Site"))
+
+
+def index_path(path):
+    return path + INDEX_SUFFIX
+
+
+def _source_stamp(path):
+    st = os.stat(path)
+    return st.st_size, st.st_mtime_ns
+
+
+def _pack_strings(strings):
+    """Merkkijonot -> (UTF-8-tavut, katkaisukohdat merkkeinä)"""
+    ends = np.zeros(len(strings) + 1, dtype=np.int64)
+    ends[1:] = np.cumsum([len(s) for s in strings])
+    return np.frombuffer("".join(strings).encode("utf-8"), dtype=np.uint8), ends
+
+
+def _unpack_strings(data, ends):
+    text = data.tobytes().decode("utf-8")
+    ends = ends.tolist()
+    return [text[a:b] for a, b in zip(ends, ends[1:])]
+
+
+class PgnIndex:
+    """Pelien sijainnit ja tärkeimmät tagit yhdestä tiedostosta"""
+
+    def __init__(self, path, offsets=None, lengths=None, frames=None, table=None, text=None):
+        self.path = path
+        self.offsets = offsets if offsets is not None else array("Q")
+        self.lengths = lengths if lengths is not None else array("I")
+        self.frames = frames if frames is not None else []
+        self.table = table       # HeaderTable, valmis kun indeksi on rakennettu
+        self.text = text         # TextIndex (nimihaku), samoin
+        self.is_zst = path.endswith(".zst")
+        self._headers = HeaderTableBuilder() if table is None else None   # tagit rakennettaessa
+        self._zst = None
+        self._mm = None
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def __getitem__(self, i):
+        return str(self.game_view(i), "utf-8", "ignore")
+
+    def tag(self, i, name, default=""):
+        # Latausäie julkaisee ensin tablen ja tyhjentää vasta sitten _headersin:
+        # kun _headers luetaan ensin, jompikumpi on aina käytettävissä
+        headers = self._headers
+        table = self.table
+        return (table if table is not None else headers).tag(i, name) or default
+
+    def game_tags(self, i):
+        tags = {}
+        for t in INDEX_TAGS:
+            value = self.tag(i, t)
+            if value:
+                tags[t] = value
+        return tags
+
+    def append(self, offset, length, tags):
+        # Tagit ensin: rivi näkyy pelilistassa vasta, kun offset on lisätty
+        self._headers.append(tags)
+        self.offsets.append(offset)
+        self.lengths.append(length)
+
+    def game_view(self, i):
+        """
+        Pelin teksti: pakkaamattomasta tiedostosta memoryview-viipale
+        muistikuvaan (ei kopiota), .zst-tiedostosta purettuna tavuina
+        """
+        offset, length = int(self.offsets[i]), int(self.lengths[i])
+        if self.is_zst:
+            if self._zst is None:
+                self._zst = ZstSeekableReader(self.path, self.frames)
+            return self._zst.read(offset, length)
+        if self._mm is None:
+            self._mm = memoryview(open_mmap(self.path))
+        return self._mm[offset:offset + length]
+
+    def game_bytes(self, i):
+        """Lukee yhden pelin tekstin levyltä tavuina"""
+        return bytes(self.game_view(i))
+
+    def export(self, ids, dst, level=3, threads=None):
+        """
+        Kirjoittaa annetut pelit (numerot nousevassa järjestyksessä) uuteen
+        monen framen .zst-tiedostoon, jota voi lukea hajasaantina.
+        """
+        def chunks():
+            for i in ids:
+                game = self.game_view(int(i))
+                yield game
+                if game[-1:] != b"\n":
+                    yield b"\n\n"
+        return write_seekable(chunks(), dst, level=level, threads=threads)
+
+    def save(self):
+        """Tallentaa valmiin indeksin sivutiedostoon (ks. tiedoston alku)"""
+        names, name_ends = _pack_strings(self.table.names)
+        terms, offsets, ids = self.text.state()
+        term_data, term_ends = _pack_strings(terms)
+        arrays = {
+            "header": np.array([INDEX_VERSION, *_source_stamp(self.path)], dtype=np.int64),
+            "offsets": np.frombuffer(self.offsets, dtype=np.uint64),
+            "lengths": np.frombuffer(self.lengths, dtype=np.uint32),
+            "frames": np.array(self.frames, dtype=np.uint64).reshape(-1, 2),
+            "names": names, "name_ends": name_ends,
+            "terms": term_data, "term_ends": term_ends,
+            "term_offsets": offsets, "term_ids": ids,
+        }
+        for name, column in self.table.columns.items():
+            arrays["col_" + name] = column
+        tmp = index_path(self.path) + ".tmp"
+        with open(tmp, "wb") as f:
+            np.savez(f, **arrays)
+        os.replace(tmp, index_path(self.path))
+
+    @classmethod
+    def load(cls, path):
+        """Lataa indeksin, jos se on olemassa ja vastaa tiedostoa. Muuten None."""
+        try:
+            with np.load(index_path(path), allow_pickle=False) as data:
+                header = data["header"].tolist()
+                if header != [INDEX_VERSION, *_source_stamp(path)]:
+                    return None
+                arrays = {name: data[name] for name in data.files}
+        except (OSError, ValueError, KeyError, EOFError, zipfile.BadZipFile):
+            return None     # puuttuu, vanha pickle-muoto tai rikki: rakennetaan uudelleen
+        columns = {name[4:]: a for name, a in arrays.items() if name.startswith("col_")}
+        table = HeaderTable(columns, _unpack_strings(arrays["names"], arrays["name_ends"]))
+        terms = _unpack_strings(arrays["terms"], arrays["term_ends"])
+        text = TextIndex(terms, arrays["term_offsets"], arrays["term_ids"])
+        frames = [tuple(f) for f in arrays["frames"].tolist()]
+        return cls(path, arrays["offsets"], arrays["lengths"], frames, table, text)
+
+    @classmethod
+    def build(cls, path, on_games=None, on_progress=None, processes=None):
+        """
+        Lukee tiedoston kerran läpi ja rakentaa indeksin.
+        on_games(indeksi, pelimäärä) kutsutaan jokaisen pelin jälkeen,
+        on_progress(luettu) luetuille tavuille.
+        Pakkaamaton .pgn luetaan rinnakkain processes prosessilla (ks. mmappgn.py).
+        """
+        index = cls(path)
+        words = TextIndexBuilder()
+
+        def add(offset, length, tags):
+            index.append(offset, length, tags)
+            words.add(len(index) - 1, tags)
+
+        if index.is_zst:
+            read_pos = 0
+
+            def chunks():
+                nonlocal read_pos
+                for read_pos, chunk in iter_zst_frames(path, index.frames, processes):
+                    yield chunk
+
+            last_pos = 0
+            for base, block in split_blocks(chunks()):
+                offsets, lengths, tags = scan_chunk(block, 0, len(block), _WANTED)
+                for offset, length, game_tags in zip(offsets, lengths, tags):
+                    add(base + offset, length, game_tags)
+                if on_games:
+                    on_games(index, len(index))
+                if on_progress and read_pos != last_pos:
+                    last_pos = read_pos
+                    on_progress(last_pos)
+        else:
+            for offsets, lengths, tags in scan_pgn(path, processes, _WANTED):
+                for offset, length, game_tags in zip(offsets, lengths, tags):
+                    add(offset, length, game_tags)
+                if on_games:
+                    on_games(index, len(index))
+                if on_progress and len(index):
+                    on_progress(index.offsets[-1] + index.lengths[-1])
+        index.text = words.finish()
+        index.table = index._headers.finish()
+        index._headers = None   # vasta tablen jälkeen (ks. tag())
+        return index
+
+
+def open_index(path, on_games=None, on_progress=None):
+    """Lataa sivutiedoston indeksin tai rakentaa ja tallentaa sen"""
+    index = PgnIndex.load(path)
+    if index is None:
+        index = PgnIndex.build(path, on_games, on_progress)
+        try:
+            index.save()
+        except OSError:
+            pass  # esim. kirjoitussuojattu hakemisto: indeksi jää vain muistiin
+        return index
+    if on_games:
+        on_games(index, len(index))
+    if on_progress:
+        on_progress(os.path.getsize(path))
+    return index
@@ -0,0 +1,105 @@
+# pgnsplit.py -- PGN-virran jakaminen kokonaisiksi peleiksi
+#
+# Peli alkaa [Event -tagista rivin alussa. Puskuri on uudelleenkäytettävä
+# bytearray ja jokainen tavu etsitään vain kerran, joten jakaminen on
+# lineaarista riippumatta palojen koosta. Header ja siirrot pysyvät samassa
+# pelissä (vrt. vanha "\n\n"-jako, joka teki niistä kaksi eri merkintää).
+
+EVENT_MARK = b"\n[Event "
+
+
+class GameSplitter:
+    """Jakaa tavupaloina tulevan PGN-virran peleiksi: (offset, pelin tavut)"""
+
+    def __init__(self):
+        self._buf = bytearray()
+        self._offset = 0     # self._buf[0]:n offset koko virrassa
+        self._scan = 0       # tähän asti on jo etsitty
+
+    def feed(self, chunk):
+        """Lisää palan ja palauttaa listan valmiista peleistä"""
+        buf = self._buf
+        buf += chunk
+        games = []
+        start = 0
+        while True:
+            i = buf.find(EVENT_MARK, self._scan)
+            if i < 0:
+                # Merkin alku voi jäädä palan loppuun, joten viimeiset tavut etsitään uudelleen
+                self._scan = max(start, len(buf) - len(EVENT_MARK) + 1)
+                break
+            end = i + 1
+            if buf[start:end].strip():
+                games.append((self._offset + start, bytes(buf[start:end])))
+            start = end
+            self._scan = end
+        if start:
+            del buf[:start]
+            self._offset += start
+            self._scan -= start
+        return games
+
+    def flush(self):
+        """Palauttaa viimeisen pelin (tai None) virran loputtua"""
+        game = None
+        if self._buf.strip():
+            game = (self._offset, bytes(self._buf))
+        self._offset += len(self._buf)
+        self._buf = bytearray()
+        self._scan = 0
+        return game
+
+
+def split_games(chunks):
+    """Generaattori: palat sisään, (offset, pelin tavut) ulos"""
+    splitter = GameSplitter()
+    for chunk in chunks:
+        yield from splitter.feed(chunk)
+    last = splitter.flush()
+    if last:
+        yield last
+
+
+def split_blocks(chunks):
+    """
+    Generaattori: palat sisään, (offset, lohko) ulos. Lohko sisältää
+    kokonaisia pelejä ja päättyy pelin rajalle, joten sen voi jakaa peleiksi
+    (ja lukea headerit) kerralla, esim. pgnheaders.scan_chunk().
+    """
+    buf = bytearray()
+    offset = 0
+    scanned = 0
+    for chunk in chunks:
+        buf += chunk
+        i = buf.rfind(EVENT_MARK, scanned)
+        if i < 0:
+            scanned = max(0, len(buf) - len(EVENT_MARK) + 1)
+            continue
+        block = bytes(buf[:i + 1])
+        del buf[:i + 1]
+        scanned = 0
+        yield offset, block
+        offset += len(block)
+    if buf:
+        yield offset, bytes(buf)
+
+
+def iter_file_chunks(path, read_size=1024 * 1024):
+    """Tiedoston (.pgn tai .zst) purettu sisältö paloina"""
+    if path.endswith(".zst"):
+        from zstseek import iter_zst_frames
+        for _, chunk in iter_zst_frames(path, read_size=read_size):
+            yield chunk
+        return
+    with open(path, "rb") as f:
+        yield from iter(lambda: f.read(read_size), b"")
+
+
+def iter_file_games(path):
+    """Tiedoston pelit: (offset, pelin tavut)"""
+    return split_games(iter_file_chunks(path))
+
+
+def iter_file_blocks(path):
+    """Tiedoston purettu sisältö kokonaisten pelien lohkoina: (offset, lohko)"""
+    return split_blocks(iter_file_chunks(path))
@@ -0,0 +1,137 @@
+# positionindex.py -- "pelit, joissa tämä asema esiintyi" Zobrist-tiivisteillä
+#
+# Valinnainen indeksointiajo käy läpi jokaisen pelin päälinjan ja tallentaa
+# jokaisen aseman Zobrist-tiivisteen (chess.polyglot) ja pelin numeron.
+# Tietueet (uint64 tiiviste, uint32 peli) tallennetaan tiivisteen mukaan
+# järjestettynä tiedostoon <tiedosto>.pos, jota luetaan np.memmap:lla:
+# haku on binäärihaku eikä tiedostoa tarvitse ladata muistiin.
+#
+# Järjestys tehdään kahdessa vaiheessa, jotta muistia ei tarvita koko
+# aineiston verran: tietueet jaetaan tiivisteen ylimpien bittien mukaan
+# ämpäritiedostoihin, ja jokainen ämpäri järjestetään erikseen.
+
+import io, os, shutil
+
+import numpy as np
+import chess.pgn, chess.polyglot
+
+from ingest import iter_batches, map_ordered
+
+POS_SUFFIX = ".pos"
+RECORD = np.dtype([("hash", "<u8"), ("game", "<u4")])
+BUCKET_BITS = 8
+FLUSH_RECORDS = 4 * 1024 * 1024
+
+
+def position_index_path(path):
+    return path + POS_SUFFIX
+
+
+def position_hash(board):
+    return chess.polyglot.zobrist_hash(board)
+
+
+def game_hashes(game):
+    """Pelin päälinjan kaikkien asemien tiivisteet (kukin kerran)"""
+    try:
+        parsed = chess.pgn.read_game(io.StringIO(game.decode("utf-8", errors="ignore")))
+    except ValueError:
+        parsed = None
+    if parsed is None:
+        return np.empty(0, dtype=np.uint64)
+    board = parsed.board()
+    hashes = [position_hash(board)]
+    for move in parsed.mainline_moves():
+        board.push(move)
+        hashes.append(position_hash(board))
+    return np.unique(np.array(hashes, dtype=np.uint64))
+
+
+def _hash_batch(batch):
+    return [game_hashes(game) for game in batch]
+
+
+def _iter_hashes(path, processes):
+    for hashes in map_ordered(_hash_batch, iter_batches(path), processes):
+        yield from hashes
+
+
+def build_position_index(path, processes=None, on_progress=None):
+    """Rakentaa <tiedosto>.pos-indeksin. on_progress(pelejä käsitelty) raportoi etenemisen."""
+    out = position_index_path(path)
+    tmpdir = out + ".tmp"
+    os.makedirs(tmpdir, exist_ok=True)
+    buffered = []
+    nbuffered = 0
+
+    def flush():
+        records = np.concatenate(buffered)
+        buckets = (records["hash"] >> np.uint64(64 - BUCKET_BITS)).astype(np.int32)
+        order = np.argsort(buckets, kind="stable")
+        records, buckets = records[order], buckets[order]
+        bounds = np.searchsorted(buckets, np.arange((1 << BUCKET_BITS) + 1))
+        for b in range(1 << BUCKET_BITS):
+            if bounds[b] < bounds[b + 1]:
+                with open(os.path.join(tmpdir, f"{b:03d}"), "ab") as f:
+                    records[bounds[b]:bounds[b + 1]].tofile(f)
+        buffered.clear()
+
+    try:
+        for game_id, hashes in enumerate(_iter_hashes(path, processes)):
+            records = np.empty(len(hashes), dtype=RECORD)
+            records["hash"] = hashes
+            records["game"] = game_id
+            buffered.append(records)
+            nbuffered += len(records)
+            if nbuffered >= FLUSH_RECORDS:
+                flush()
+                nbuffered = 0
+            if on_progress and game_id % 1000 == 0:
+                on_progress(game_id)
+        if buffered:
+            flush()
+
+        with open(out + ".part", "wb") as f:
+            for b in range(1 << BUCKET_BITS):
+                name = os.path.join(tmpdir, f"{b:03d}")
+                if not os.path.exists(name):
+                    continue
+                records = np.fromfile(name, dtype=RECORD)
+                records[np.argsort(records["hash"], kind="stable")].tofile(f)
+        os.replace(out + ".part", out)
+    finally:
+        shutil.rmtree(tmpdir, ignore_errors=True)
+    return PositionIndex(out)
+
+
+class PositionIndex:
+    """Muistikuvattu, tiivisteen mukaan järjestetty (tiiviste, peli) -taulu"""
+
+    def __init__(self, filename):
+        self.filename = filename
+        if os.path.getsize(filename):
+            self._records = np.memmap(filename, dtype=RECORD, mode="r")
+        else:
+            self._records = np.empty(0, dtype=RECORD)
+        self._hashes = self._records["hash"]
+
+    def __len__(self):
+        return len(self._records)
+
+    def games(self, board):
+        """Pelit (numerot nousevassa järjestyksessä), joissa asema esiintyi päälinjalla"""
+        h = np.uint64(position_hash(board))
+        lo = np.searchsorted(self._hashes, h, side="left")
+        hi = np.searchsorted(self._hashes, h, side="right")
+        return np.unique(self._records["game"][lo:hi])
+
+
+def open_position_index(path):
+    """Lataa <tiedosto>.pos, jos se on olemassa ja tuoreempi kuin tiedosto. Muuten None."""
+    filename = position_index_path(path)
+    try:
+        if os.path.getmtime(filename) < os.path.getmtime(path):
+            return None
+    except OSError:
+        return None
+    return PositionIndex(filename)
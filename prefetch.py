@@ -0,0 +1,198 @@
+# prefetch.py -- viereisten pelien ja tulevien asemien esilataus taustalla
+#
+# Kun käyttäjä on pysähtynyt peliin tai siirtoon, taustasäie
+#  1. piirtää nykyisen pelin seuraavat PRERENDER_PLIES asemaa (ja edellisen)
+#     kuvavälimuistiin (imagecache.BoardImageCache),
+#  2. lukee ja jäsentää pelilistan viereiset pelit (±PREFETCH_GAMES) ja
+#  3. piirtää niiden alkuasemat.
+# Seuraava peli tai siirto löytyy silloin valmiina eikä pääsäie odota levyä,
+# chess.pgn-jäsennystä tai SVG-piirtoa.
+#
+# Samalla säikeellä luetaan myös valittu peli, jos sen luku voi kestää
+# (load(): esim. yhden framen .zst, jossa luku voi purkaa tiedoston alusta),
+# jottei pääsäie jää odottamaan.
+#
+# Säie käsittelee aina vain uusimman pyynnön: uusi request() keskeyttää
+# edellisen seuraavan asian kohdalla. clear():n (uusi tiedosto) jälkeen
+# valmistuvaa vanhan tiedoston peliä ei tallenneta välimuistiin, koska pelien
+# numerot viittaavat silloin eri tiedostoon. Tk-widgetteihin säie ei koske.
+
+import io, threading
+from collections import OrderedDict
+
+import chess, chess.pgn
+
+from boardhistory import BoardHistory
+from imagecache import board_key
+
+PREFETCH_GAMES = 3      # esiladataan näin monta peliä kummaltakin puolelta
+PRERENDER_PLIES = 6     # piirretään näin monta puolisiirtoa eteenpäin
+CACHE_GAMES = 64        # jäsennettyjä pelejä muistissa
+
+
+class ParsedGame:
+    """Pelin teksti, päälinjan siirrot ja asemahistoria"""
+
+    def __init__(self, text, moves, history):
+        self.text = text
+        self.moves = moves
+        self.history = history
+
+
+def parse_game(text):
+    """PGN-teksti -> ParsedGame (virheellisestä pelistä tyhjä siirtolista)"""
+    moves, start = [], None
+    try:
+        game = chess.pgn.read_game(io.StringIO(text))
+        if game:
+            moves = list(game.mainline_moves())
+            start = game.board()
+    except Exception:
+        moves = []
+    return ParsedGame(text, moves, BoardHistory(moves, start=start))
+
+
+class GamePrefetcher:
+    """
+    Jäsennettyjen pelien LRU-välimuisti ja taustasäie, joka täyttää sen ja
+    kuvavälimuistin etukäteen. render(board, size, flipped) piirtää PIL-kuvan;
+    None = kuvia ei piirretä etukäteen (esim. sprite-piirto).
+    """
+
+    def __init__(self, image_cache, render=None, cache_size=CACHE_GAMES):
+        self.image_cache = image_cache
+        self.render = render
+        self.cache_size = cache_size
+        self._games = OrderedDict()
+        self._cond = threading.Condition()
+        self._request = None      # odottava pyyntö
+        self._generation = 0      # kasvaa jokaisesta pyynnöstä; vanha työ keskeytyy
+        self._cache_generation = 0  # kasvaa clear()issa; vanhan tiedoston pelejä ei tallenneta
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def cached(self, game_id):
+        """Jäsennetty peli välimuistista tai None"""
+        with self._cond:
+            parsed = self._games.get(game_id)
+            if parsed is not None:
+                self._games.move_to_end(game_id)
+            return parsed
+
+    def game(self, games, game_id):
+        """Jäsennetty peli välimuistista tai heti luettuna ja jäsennettynä"""
+        parsed = self.cached(game_id)
+        if parsed is not None:
+            return parsed
+        with self._cond:
+            cache_generation = self._cache_generation
+        parsed = parse_game(games[game_id])
+        self._store(game_id, parsed, cache_generation)
+        return parsed
+
+    def load(self, games, game_id, on_loaded):
+        """
+        Lukee ja jäsentää pelin taustasäikeessä ja kutsuu siellä
+        on_loaded(peli, virhe). Korvaa odottavan pyynnön; jos uusi pyyntö tai
+        clear() ehtii väliin, on_loaded jää kutsumatta.
+        """
+        with self._cond:
+            self._generation += 1
+            self._request = (self._load, (self._generation, self._cache_generation,
+                                          games, game_id, on_loaded))
+            self._cond.notify()
+
+    def clear(self):
+        """Tyhjentää välimuistin ja peruu odottavan työn (uusi tiedosto)"""
+        with self._cond:
+            self._games.clear()
+            self._request = None
+            self._generation += 1
+            self._cache_generation += 1
+
+    def request(self, games, ids, history, ply, size, flipped):
+        """
+        Pyytää esilatauksen: pelit ids ja history-pelin asemat puolisiirrosta
+        ply eteenpäin. Ei odota; edellinen kesken oleva pyyntö hylätään.
+        """
+        with self._cond:
+            self._generation += 1
+            self._request = (self._prefetch, (self._generation, self._cache_generation,
+                                              games, list(ids), history, ply, size, flipped))
+            self._cond.notify()
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._request = None
+            self._generation += 1
+            self._cond.notify()
+
+    def _store(self, game_id, parsed, cache_generation):
+        with self._cond:
+            if cache_generation != self._cache_generation:
+                return  # clear() välissä: peli on edellisestä tiedostosta
+            self._games[game_id] = parsed
+            self._games.move_to_end(game_id)
+            while len(self._games) > self.cache_size:
+                self._games.popitem(last=False)
+
+    def _stale(self, generation):
+        return generation != self._generation
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._request is None and not self._closed:
+                    self._cond.wait()
+                if self._closed:
+                    return
+                (work, args), self._request = self._request, None
+            try:
+                work(*args)
+            except Exception:
+                pass  # esilataus on vain nopeutus: virhe näkyy, kun peli avataan
+
+    def _load(self, generation, cache_generation, games, game_id, on_loaded):
+        parsed = self.cached(game_id)
+        if parsed is None:
+            try:
+                parsed = parse_game(games[game_id])
+            except Exception as e:
+                if not self._stale(generation):
+                    on_loaded(None, e)
+                return
+            self._store(game_id, parsed, cache_generation)
+        if not self._stale(generation):
+            on_loaded(parsed, None)
+
+    def _prefetch(self, generation, cache_generation, games, ids, history, ply, size, flipped):
+        # Nykyisen pelin seuraavat asemat ensin, sitten viereiset pelit
+        last = len(history) - 1
+        for p in [*range(ply + 1, min(ply + PRERENDER_PLIES, last) + 1), ply - 1]:
+            if self._stale(generation):
+                return
+            if 0 <= p <= last:
+                self._render(history.board_at(p), size, flipped)
+        for game_id in ids:
+            if self._stale(generation):
+                return
+            with self._cond:
+                cached = game_id in self._games
+            if not cached:
+                self._store(game_id, parse_game(games[game_id]), cache_generation)
+        for game_id in ids:
+            if self._stale(generation):
+                return
+            with self._cond:
+                parsed = self._games.get(game_id)
+            if parsed is not None:
+                self._render(parsed.history.board_at(0), size, flipped)
+
+    def _render(self, board, size, flipped):
+        if self.render is None:
+            return
+        key = board_key(board, flipped, size)
+        if key not in self.image_cache:
+            self.image_cache.put(key, self.render(board, size, flipped))
@@ -0,0 +1,127 @@
+# selobatch.py -- SELO-laskenta kokonaisille kausille NumPy-taulukoilla
+#
+# Sama laskenta kuin selo.py:n established_player_selo ja new_player_selo,
+# mutta kaikille pelaajille kerralla: jokainen peli on kaksi tietuetta
+# (pelaaja, vastustaja, pisteet, peliaika), odotustulokset ja K-kertoimet
+# lasketaan taulukoina ja pelaajakohtaiset summat np.bincountilla.
+#
+# Tulokset ovat bitilleen samat kuin selo.py:ssä:
+#  - odotustulos riippuu vain kokonaislukuerosta D = Ro - Ri, joten se
+#    haetaan taulukosta, joka on laskettu selo.elo_expected-funktiolla
+#    (np.power voi poiketa Pythonin **-operaattorista viimeisessä bitissä)
+#  - bincount summaa pelit tietueiden järjestyksessä samoin kuin selo.py:n silmukka
+#  - pyöristykset kuten selo.py:ssä: int(Rn + 0.5) ja round() (np.rint)
+#
+# Arviointijaksot lasketaan SSL:n järjestyksessä: jaksot aikajärjestyksessä ja
+# jakson sisällä kaikki pelit jakson alun vahvuusluvuilla.
+
+import numpy as np
+
+from selo import elo_expected
+
+NO_RATING = 0
+_TABLE_RANGE = 4000
+_expected_table = None
+
+
+def expected_scores(ro, ri):
+    """Odotustulokset taulukkona (kuten selo.elo_expected, kokonaislukuluvuille)"""
+    global _expected_table
+    d = np.asarray(ro, dtype=np.int64) - np.asarray(ri, dtype=np.int64)
+    if not len(d):
+        return np.empty(0)
+    if np.abs(d).max() <= _TABLE_RANGE:
+        if _expected_table is None:
+            _expected_table = np.array([elo_expected(v, 0) for v in range(-_TABLE_RANGE, _TABLE_RANGE + 1)])
+        return _expected_table[d + _TABLE_RANGE]
+    values, inverse = np.unique(d, return_inverse=True)
+    return np.array([elo_expected(int(v), 0) for v in values])[inverse]
+
+
+def kr_for_ro(ro):
+    """SSL 7.7 taulukkona (ks. selo.Kr_for_Ro)"""
+    ro = np.asarray(ro)
+    return np.select([ro >= 2050, ro >= 1950, ro >= 1850, ro >= 1750, ro >= 1650],
+                     [20, 25, 30, 35, 40], 45)
+
+
+def kt_for_time(minutes, ro):
+    """SSL 7.8 taulukkona (ks. selo.Kt_for_time)"""
+    minutes, ro = np.asarray(minutes), np.asarray(ro)
+    return np.where(minutes >= 90, 1.0,
+                    np.where(minutes >= 60, 0.5,
+                             np.where(ro <= 2299, 0.3, 0.1)))
+
+
+def _interleave(a, b):
+    out = np.empty(2 * len(a), dtype=np.result_type(a, b))
+    out[0::2], out[1::2] = a, b
+    return out
+
+
+def game_records(white, black, white_score, minutes):
+    """
+    Pelit (valkea, musta, valkean pisteet, peliaika) -> tietueet molempien
+    pelaajien näkökulmasta: (pelaaja, vastustaja, pisteet, peliaika).
+    Tietueet ovat pelien järjestyksessä, joten kunkin pelaajan pelit summataan
+    samassa järjestyksessä kuin selo.py:lle annetuissa listoissa.
+    """
+    white, black = np.asarray(white), np.asarray(black)
+    white_score, minutes = np.asarray(white_score, dtype=np.float64), np.asarray(minutes)
+    return (_interleave(white, black), _interleave(black, white),
+            _interleave(white_score, 1.0 - white_score), _interleave(minutes, minutes))
+
+
+def rate_period(ratings, established, player, opponent, score, minutes):
+    """
+    Yhden arviointijakson uudet vahvuusluvut.
+    ratings: int-taulukko pelaajittain (NO_RATING = ei lukua), established: bool-taulukko.
+    Tietueet kuten game_records(). Pelejä luvuttomia vastaan ei oteta huomioon.
+    Vakiintuneet pelaajat lasketaan kaavalla 7.2, luvuttomat kaavalla 7.3;
+    luvun saanut pelaaja on seuraavasta jaksosta alkaen vakiintunut.
+    Palauttaa (uudet luvut, uusi established).
+    """
+    n = len(ratings)
+    player, opponent = np.asarray(player), np.asarray(opponent)
+    score, minutes = np.asarray(score, dtype=np.float64), np.asarray(minutes)
+    keep = ratings[opponent] != NO_RATING
+    player, opponent, score, minutes = player[keep], opponent[keep], score[keep], minutes[keep]
+    ri = ratings[opponent]
+    games = np.bincount(player, minlength=n)
+    new_ratings = ratings.copy()
+    new_established = established.copy()
+
+    # 7.2: Rn = Ro + Kr * (sum Kt * (W - E) + N) / 10
+    old = established[player]
+    p, ro = player[old], ratings[player[old]]
+    terms = kt_for_time(minutes[old], ro) * (score[old] - expected_scores(ro, ri[old]))
+    total = np.bincount(p, weights=terms, minlength=n)
+    rated = established & (games > 0)
+    rn = ratings + kr_for_ro(ratings) * (total + games) / 10.0
+    new_ratings[rated] = (rn[rated] + 0.5).astype(np.int64)
+
+    # 7.3: Rn = sum Ri / N + 400 * (W - N/2) + N/10
+    new = ~old
+    p = player[new]
+    ri_sum = np.bincount(p, weights=ri[new], minlength=n)
+    w = np.bincount(p, weights=score[new], minlength=n)
+    first = ~established & (games > 0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rn = ri_sum / games + 400.0 * (w - games / 2.0) + games / 10.0
+    new_ratings[first] = np.rint(rn[first]).astype(np.int64)
+    new_established[first] = True
+    return new_ratings, new_established
+
+
+def rate_periods(periods, ratings, established=None):
+    """
+    Laskee arviointijaksot järjestyksessä. periods: iteroitava, jonka alkiot
+    ovat (pelaaja, vastustaja, pisteet, peliaika) -tietueita (ks. game_records).
+    Palauttaa lopulliset (luvut, established).
+    """
+    ratings = np.asarray(ratings, dtype=np.int64).copy()
+    if established is None:
+        established = ratings != NO_RATING
+    for player, opponent, score, minutes in periods:
+        ratings, established = rate_period(ratings, established, player, opponent, score, minutes)
+    return ratings, established
@@ -0,0 +1,153 @@
+# selopgn.py -- SELO-laskenta suoraan PGN-tiedoston headereista
+#
+# Tiedostosta (.pgn tai .zst) luetaan vain tagit White, Black, Result, Date,
+# TimeControl, WhiteElo ja BlackElo. Pelit ryhmitellään arviointijaksoihin
+# päivämäärän mukaan ja talletetaan kompakteihin array-taulukoihin
+# (pelaajat numeroina, noin 13 tavua peliä kohden). Lopuksi jaksot lasketaan
+# aikajärjestyksessä selobatch.rate_period()-funktiolla.
+#
+# Jos tiedosto on aikajärjestyksessä (chronological=True), jakso lasketaan ja
+# vapautetaan heti, kun seuraavan jakson ensimmäinen peli tulee vastaan, joten
+# muistissa on kerrallaan vain yksi jakso.
+
+from array import array
+
+import numpy as np
+
+from pgnheaders import iter_file_headers
+from selobatch import NO_RATING, game_records, rate_period
+
+SELO_TAGS = frozenset(("White", "Black", "Result", "Date", "TimeControl", "WhiteElo", "BlackElo"))
+_WHITE_SCORE = {"1-0": 2, "1/2-1/2": 1, "0-1": 0}   # puolikkaina pisteinä
+
+
+def first60_minutes(time_control):
+    """
+    PGN:n TimeControl -> ensimmäisten 60 siirron peliaika minuutteina (SSL 7.8).
+    Jokaisen alkavan aikajakson perusaika lasketaan kokonaan ja lisäaika
+    jakson siirroille 60 siirtoon asti.
+    "5400+30" -> 120.0, "40/7200:1800" -> 150.0, "180+2" -> 5.0, tuntematon -> None.
+    """
+    if not time_control or time_control in ("?", "-"):
+        return None
+    seconds, moves = 0.0, 0
+    try:
+        for field in time_control.split(":"):
+            count, sep, rest = field.partition("/")
+            if not sep:
+                count, rest = 60, field
+            base, _, inc = rest.lstrip("*").partition("+")
+            n = min(int(count), 60 - moves)
+            seconds += float(base) + float(inc or 0) * n
+            moves += n
+            if moves >= 60:
+                break
+    except ValueError:
+        return None
+    return seconds / 60.0
+
+
+def period_key(date, months=1):
+    """"2023.05.14" -> jakson numero (kuukaudet vuodesta 0 / months), tuntematon -> None"""
+    parts = (date or "").replace("-", ".").split(".")
+    if len(parts) < 2 or not parts[0].isdigit() or not parts[1].isdigit():
+        return None
+    month = int(parts[1])
+    if not 1 <= month <= 12:
+        return None
+    return (int(parts[0]) * 12 + month - 1) // months
+
+
+def _elo(value):
+    return int(value) if value and value.isdigit() else NO_RATING
+
+
+class SeloPipeline:
+    """Kerää pelit headereista ja laskee pelaajien SELO-luvut jaksoittain"""
+
+    def __init__(self, period_months=1, default_minutes=90, initial=None, chronological=False):
+        self.period_months = period_months
+        self.default_minutes = default_minutes
+        self.chronological = chronological
+        self.names = []
+        self._ids = {}
+        self._initial = array("i")      # pelaajan lähtöluku (initial tai ensimmäinen header-Elo)
+        self._given = dict(initial or {})
+        self._periods = {}              # jakso -> (valkea, musta, valkean pisteet * 2, minuutit)
+        self._current = None
+        self.ratings = np.zeros(0, dtype=np.int64)
+        self.established = np.zeros(0, dtype=bool)
+        self.games = np.zeros(0, dtype=np.int64)
+        self.added = 0
+        self.skipped = 0
+        self.late = 0                   # aikajärjestyksessä jo lasketun jakson pelit
+
+    def _player(self, name, elo):
+        i = self._ids.get(name)
+        if i is None:
+            i = self._ids[name] = len(self.names)
+            self.names.append(name)
+            self._initial.append(self._given.get(name, _elo(elo)))
+        return i
+
+    def add(self, tags):
+        """Lisää yhden pelin tagit. Palauttaa False, jos peliä ei voi laskea."""
+        score = _WHITE_SCORE.get(tags.get("Result"))
+        key = period_key(tags.get("Date"), self.period_months)
+        minutes = first60_minutes(tags.get("TimeControl"))
+        if minutes is None:
+            minutes = self.default_minutes
+        white, black = tags.get("White"), tags.get("Black")
+        if score is None or key is None or minutes is None or not white or not black or white == black:
+            self.skipped += 1
+            return False
+        if self.chronological and self._current is not None and key != self._current:
+            if key < self._current:
+                self.late += 1
+                return False
+            self._rate_until(key)
+        self._current = key
+
+        games = self._periods.get(key)
+        if games is None:
+            games = self._periods[key] = (array("i"), array("i"), array("b"), array("f"))
+        games[0].append(self._player(white, tags.get("WhiteElo")))
+        games[1].append(self._player(black, tags.get("BlackElo")))
+        games[2].append(score)
+        games[3].append(minutes)
+        self.added += 1
+        return True
+
+    def _grow(self):
+        n = len(self.names)
+        if len(self.ratings) < n:
+            old = len(self.ratings)
+            initial = np.frombuffer(self._initial, dtype=np.int32)[old:n]
+            self.ratings = np.concatenate([self.ratings, initial.astype(np.int64)])
+            self.established = np.concatenate([self.established, initial != NO_RATING])
+            self.games = np.concatenate([self.games, np.zeros(n - old, dtype=np.int64)])
+
+    def _rate_until(self, stop=None):
+        """Laskee kaikki jaksot, jotka ovat ennen jaksoa stop (None = kaikki)"""
+        self._grow()
+        for key in sorted(k for k in self._periods if stop is None or k < stop):
+            white, black, score, minutes = (np.frombuffer(a, dtype=a.typecode) for a in self._periods.pop(key))
+            records = game_records(white, black, score / 2.0, minutes)
+            self.games += np.bincount(records[0], minlength=len(self.games))
+            self.ratings, self.established = rate_period(self.ratings, self.established, *records)
+
+    def finish(self):
+        """Laskee jäljellä olevat jaksot. Palauttaa [(nimi, SELO, pelit), ...] nimen mukaan."""
+        self._rate_until()
+        return sorted(
+            (name, int(self.ratings[i]), int(self.games[i]))
+            for i, name in enumerate(self.names) if self.ratings[i] != NO_RATING
+        )
+
+
+def rate_file(path, processes=None, **options):
+    """Laskee tiedoston pelaajien SELO-luvut yhdellä läpikäynnillä (ks. SeloPipeline)"""
+    pipeline = SeloPipeline(**options)
+    for _, tags in iter_file_headers(path, SELO_TAGS, processes):
+        pipeline.add(tags)
+    return pipeline.finish(), pipeline
@@ -0,0 +1,85 @@
+# spriteboard.py -- laudan piirto valmiiksi rasteroiduilla nappulakuvilla
+#
+# 12 nappulaa rasteroidaan kerran kutakin ruutukokoa kohden (chess.svg.piece +
+# cairosvg). Ruudut ovat canvasin suorakulmioita ja nappulat kuvaolioita,
+# joten siirron jälkeen päivitetään vain muuttuneet ruudut eikä koko lautaa
+# rasteroida uudelleen.
+
+import io
+
+import chess, chess.svg, cairosvg
+from PIL import Image, ImageTk
+
+LIGHT_SQUARE = "#ffce9e"   # samat värit kuin chess.svg.board
+DARK_SQUARE = "#d18b47"
+TAG = "spriteboard"
+
+
+def render_piece_sprites(square_size):
+    """Rasteroi kaikki 12 nappulaa annettuun ruutukokoon: {symboli: PIL.Image}"""
+    sprites = {}
+    for symbol in "PNBRQKpnbrqk":
+        svg = chess.svg.piece(chess.Piece.from_symbol(symbol), size=square_size)
+        image = Image.open(io.BytesIO(cairosvg.svg2png(bytestring=svg.encode("utf-8"))))
+        image.load()
+        sprites[symbol] = image
+    return sprites
+
+
+class SpriteBoardRenderer:
+    """Piirtää aseman Tk-canvasille ja päivittää vain muuttuneet ruudut"""
+
+    def __init__(self, canvas):
+        self.canvas = canvas
+        self.square_size = 0
+        self.flipped = False
+        self._photos = {}        # symboli -> PhotoImage nykyisessä koossa
+        self._pieces = {}        # ruutu -> (symboli, canvas-olio)
+
+    def reset(self):
+        """Unohtaa piirretyn laudan (esim. kun canvas on tyhjennetty muualla)"""
+        self.canvas.delete(TAG)
+        self.square_size = 0
+        self._pieces = {}
+
+    def _xy(self, square):
+        f, r = chess.square_file(square), chess.square_rank(square)
+        if self.flipped:
+            f, r = 7 - f, 7 - r
+        return f * self.square_size, (7 - r) * self.square_size
+
+    def _setup(self, size, flipped):
+        self.reset()
+        self.square_size = size // 8
+        self.flipped = flipped
+        sq = self.square_size
+        self._photos = {s: ImageTk.PhotoImage(img) for s, img in render_piece_sprites(sq).items()}
+        for square in chess.SQUARES:
+            x, y = self._xy(square)
+            light = (chess.square_file(square) + chess.square_rank(square)) % 2 == 1
+            self.canvas.create_rectangle(x, y, x + sq, y + sq, width=0, tags=TAG,
+                                         fill=LIGHT_SQUARE if light else DARK_SQUARE)
+
+    def draw(self, board, size, flipped=False):
+        """Piirtää aseman; vain edelliseen piirtoon nähden muuttuneet ruudut päivitetään"""
+        if size // 8 < 1:
+            return
+        if size // 8 != self.square_size or flipped != self.flipped:
+            self._setup(size, flipped)
+
+        for square in chess.SQUARES:
+            piece = board.piece_at(square)
+            symbol = piece.symbol() if piece else None
+            old = self._pieces.get(square)
+            if (old[0] if old else None) == symbol:
+                continue
+            if symbol is None:
+                self.canvas.delete(old[1])
+                del self._pieces[square]
+            elif old:
+                self.canvas.itemconfig(old[1], image=self._photos[symbol])
+                self._pieces[square] = (symbol, old[1])
+            else:
+                x, y = self._xy(square)
+                item = self.canvas.create_image(x, y, anchor="nw", image=self._photos[symbol], tags=TAG)
+                self._pieces[square] = (symbol, item)
@@ -0,0 +1,124 @@
+# textindex.py -- käänteinen hakemisto pelaajien, tapahtumien ja paikkojen nimille
+#
+# Jokainen nimien sana (pienellä kirjoitettuna) osoittaa järjestettyyn
+# listaan pelien numeroita. Sanat ovat aakkosjärjestyksessä, joten
+# alkuosahaku ("carl" -> carlsen, carlos...) on binäärihaku. Kaikkien sanojen
+# pelilistat ovat yhdessä yhtenäisessä uint32-taulukossa.
+
+import re
+from array import array
+from bisect import bisect_left
+from urllib.parse import urlsplit
+
+import numpy as np
+
+TEXT_TAGS = ("White", "Black", "Event", "Site")
+_WORD = re.compile(r"\w+")
+
+
+def tokenize(text):
+    return _WORD.findall(text.lower())
+
+
+def game_tokens(tags):
+    """Pelin hakusanat. URL-muotoisesta Sitestä otetaan vain palvelimen nimi,
+    muuten jokaisen pelin oma tunniste paisuttaisi hakemiston."""
+    words = set()
+    for tag in TEXT_TAGS:
+        value = tags.get(tag)
+        if not value:
+            continue
+        if tag == "Site" and "://" in value:
+            value = urlsplit(value).hostname or ""
+        words.update(tokenize(value))
+    return words
+
+
+class TextIndexBuilder:
+    """Kerää hakusanat pelien numeroineen (pelit lisätään nousevassa järjestyksessä)"""
+
+    def __init__(self):
+        self._postings = {}
+
+    def add(self, game_id, tags):
+        postings = self._postings
+        for word in game_tokens(tags):
+            ids = postings.get(word)
+            if ids is None:
+                ids = postings[word] = array("I")
+            ids.append(game_id)
+
+    def finish(self):
+        terms = sorted(self._postings)
+        offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(self._postings[t]) for t in terms])
+        ids = np.empty(int(offsets[-1]), dtype=np.uint32)
+        for i, term in enumerate(terms):
+            ids[offsets[i]:offsets[i + 1]] = np.frombuffer(self._postings[term], dtype=np.uint32)
+        return TextIndex(terms, offsets, ids)
+
+
+class TextIndex:
+    """Sana -> pelit. Haku: jokaisen kyselyn sanan alkuosa, sanat yhdistetään AND-ehdolla."""
+
+    def __init__(self, terms, offsets, ids):
+        self.terms = terms
+        self.offsets = offsets
+        self.ids = ids
+
+    def _slice(self, i):
+        return self.ids[self.offsets[i]:self.offsets[i + 1]]
+
+    def postings(self, word):
+        """Pelit, joissa sana esiintyy sellaisenaan"""
+        i = bisect_left(self.terms, word)
+        if i < len(self.terms) and self.terms[i] == word:
+            return self._slice(i)
+        return np.empty(0, dtype=np.uint32)
+
+    def prefix(self, prefix):
+        """Pelit, joissa jokin sana alkaa annetulla alkuosalla"""
+        lo = bisect_left(self.terms, prefix)
+        hi = bisect_left(self.terms, prefix + "\U0010ffff")
+        if hi - lo == 0:
+            return np.empty(0, dtype=np.uint32)
+        if hi - lo == 1:
+            return self._slice(lo)
+        return np.unique(self.ids[self.offsets[lo]:self.offsets[hi]])
+
+    def search(self, query):
+        """Kaikki osumat järjestyksessä, esim. search("carls magn")"""
+        result = None
+        for word in tokenize(query):
+            hits = self.prefix(word)
+            result = hits if result is None else np.intersect1d(result, hits, assume_unique=True)
+            if len(result) == 0:
+                break
+        return result if result is not None else np.empty(0, dtype=np.uint32)
+
+    def state(self):
+        return self.terms, self.offsets, self.ids
+
+
+class SearchCursor:
+    """"Etsi seuraava" -kursori hakutulosten yli (kiertää lopusta alkuun)"""
+
+    def __init__(self, query, hits):
+        self.query = query
+        self.hits = hits
+        self.pos = -1
+
+    def __len__(self):
+        return len(self.hits)
+
+    def next(self):
+        if not len(self.hits):
+            return None
+        self.pos = (self.pos + 1) % len(self.hits)
+        return int(self.hits[self.pos])
+
+    def prev(self):
+        if not len(self.hits):
+            return None
+        self.pos = (self.pos - 1) % len(self.hits)
+        return int(self.hits[self.pos])
@@ -0,0 +1,63 @@
+# uiqueue.py -- säieturvallinen kanava taustasäikeiltä Tkinter-pääsilmukkaan
+#
+# Taustasäikeet eivät saa koskea Tk-widgetteihin. Ne lähettävät kanavaan
+# kutsuja, ja pääsilmukka purkaa kanavan kiinteällä tahdilla (TICK_MS).
+# set()-kutsut yhdistetään avaimen mukaan: saman avaimen (esim. "progress")
+# päivityksistä ajetaan vain uusin, joten tuhannet päivitykset sekunnissa
+# eivät tuota tuhansia Tk-tapahtumia.
+
+import queue, threading, traceback
+
+TICK_MS = 50
+
+
+class UiChannel:
+    """Jono taustasäikeiltä pääsäikeelle, purku root.after-ajastimella"""
+
+    def __init__(self, root, tick_ms=TICK_MS):
+        self.root = root
+        self.tick_ms = tick_ms
+        self._queue = queue.SimpleQueue()
+        self._latest = {}
+        self._lock = threading.Lock()
+        self._job = None
+
+    def post(self, fn, *args):
+        """Ajaa fn(*args) pääsäikeessä, järjestyksessä muiden kutsujen kanssa"""
+        self._queue.put((None, fn, args))
+
+    def set(self, key, fn, *args):
+        """Kuten post, mutta samalla avaimella odottavista kutsuista ajetaan vain viimeisin"""
+        with self._lock:
+            pending = key in self._latest
+            self._latest[key] = (fn, args)
+        if not pending:
+            self._queue.put((key, None, None))
+
+    def start(self):
+        if self._job is None:
+            self._job = self.root.after(self.tick_ms, self._tick)
+
+    def stop(self):
+        if self._job is not None:
+            self.root.after_cancel(self._job)
+            self._job = None
+
+    def _tick(self):
+        self.drain()
+        self._job = self.root.after(self.tick_ms, self._tick)
+
+    def drain(self):
+        """Ajaa jonossa olevat kutsut (vain tämän hetken sisällön, ei myöhemmin tulleita)"""
+        for _ in range(self._queue.qsize()):
+            try:
+                key, fn, args = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if key is not None:
+                with self._lock:
+                    fn, args = self._latest.pop(key)
+            try:
+                fn(*args)
+            except Exception:
+                traceback.print_exc()
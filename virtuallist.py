@@ -0,0 +1,145 @@
+# virtuallist.py -- virtuaalinen lista suurille pelimäärille (Tkinter)
+#
+# Toisin kuin tk.Listbox, lista ei säilytä rivejä: se tietää vain rivien määrän
+# ja pyytää näkyvien rivien tekstit row_text(i)-funktiolta. Canvasilla on vain
+# näkyvän alueen verran tekstiolioita, joten muisti ja piirtoaika eivät riipu
+# rivien määrästä.
+
+import tkinter as tk
+import tkinter.font as tkfont
+from tkinter import ttk
+
+
+class VirtualList(tk.Frame):
+    """Vieritettävä lista, joka piirtää vain näkyvät rivit"""
+
+    def __init__(self, master, row_text, width=40, height=30, font=None, **kw):
+        super().__init__(master, **kw)
+        self.row_text = row_text
+        self.count = 0
+        self.top = 0            # ylimmän näkyvän rivin numero
+        self.selected = None
+
+        self.font = tkfont.nametofont("TkDefaultFont") if font is None else tkfont.Font(font=font)
+        self.row_height = self.font.metrics("linespace") + 2
+        char_width = self.font.measure("0")
+
+        self.canvas = tk.Canvas(self, width=width * char_width, height=height * self.row_height,
+                                bg="white", highlightthickness=1, takefocus=1)
+        self.scrollbar = ttk.Scrollbar(self, orient="vertical", command=self.yview)
+        self.scrollbar.pack(side="right", fill="y")
+        self.canvas.pack(side="left", fill="both", expand=True)
+
+        self._items = []        # uudelleenkäytettävät tekstioliot
+        self._highlight = self.canvas.create_rectangle(0, 0, 0, 0, fill="#3874d8", outline="", state="hidden")
+
+        self.canvas.bind("<Configure>", lambda e: self.redraw())
+        self.canvas.bind("<Button-1>", self._on_click)
+        self.canvas.bind("<MouseWheel>", lambda e: self.scroll(-1 if e.delta > 0 else 1, "units"))
+        self.canvas.bind("<Button-4>", lambda e: self.scroll(-1, "units"))
+        self.canvas.bind("<Button-5>", lambda e: self.scroll(1, "units"))
+        self.canvas.bind("<Up>", lambda e: self._step(-1))
+        self.canvas.bind("<Down>", lambda e: self._step(1))
+        self.canvas.bind("<Prior>", lambda e: self._step(-self.visible_rows()))
+        self.canvas.bind("<Next>", lambda e: self._step(self.visible_rows()))
+
+    # --- Rivimäärä ja valinta ---
+
+    def set_count(self, count):
+        self.count = count
+        if self.selected is not None and self.selected >= count:
+            self.selected = None
+        self.top = max(0, min(self.top, count - self.visible_rows()))
+        self.redraw()
+
+    def clear(self):
+        self.selected = None
+        self.top = 0
+        self.set_count(0)
+
+    def size(self):
+        return self.count
+
+    def curselection(self):
+        return () if self.selected is None else (self.selected,)
+
+    def select(self, i):
+        """Valitsee rivin ja vierittää sen näkyviin (ei lähetä <<ListboxSelect>>)"""
+        self.selected = i
+        self.see(i)
+
+    def see(self, i):
+        rows = self.visible_rows()
+        if i < self.top:
+            self.top = i
+        elif i >= self.top + rows:
+            self.top = i - rows + 1
+        self.redraw()
+
+    # --- Vieritys ---
+
+    def visible_rows(self):
+        return max(1, self.canvas.winfo_height() // self.row_height)
+
+    def yview(self, *args):
+        if args[0] == "moveto":
+            self.top = int(float(args[1]) * self.count)
+            self._clamp()
+            self.redraw()
+        elif args[0] == "scroll":
+            self.scroll(int(args[1]), args[2])
+
+    def scroll(self, n, what="units"):
+        self.top += n * (self.visible_rows() if what == "pages" else 1)
+        self._clamp()
+        self.redraw()
+
+    def _clamp(self):
+        self.top = max(0, min(self.top, self.count - self.visible_rows()))
+
+    # --- Piirto ---
+
+    def redraw(self):
+        rows = self.visible_rows() + 1
+        while len(self._items) < rows:
+            self._items.append(self.canvas.create_text(4, 0, anchor="nw", font=self.font))
+        width = self.canvas.winfo_width()
+
+        for slot, item in enumerate(self._items):
+            i = self.top + slot
+            if slot < rows and i < self.count:
+                fill = "white" if i == self.selected else "black"
+                self.canvas.coords(item, 4, slot * self.row_height + 1)
+                self.canvas.itemconfig(item, text=self.row_text(i), fill=fill, state="normal")
+            else:
+                self.canvas.itemconfig(item, state="hidden")
+
+        if self.selected is not None and self.top <= self.selected < self.top + rows:
+            y = (self.selected - self.top) * self.row_height
+            self.canvas.coords(self._highlight, 0, y, width, y + self.row_height)
+            self.canvas.itemconfig(self._highlight, state="normal")
+            self.canvas.tag_lower(self._highlight)
+        else:
+            self.canvas.itemconfig(self._highlight, state="hidden")
+
+        if self.count:
+            self.scrollbar.set(self.top / self.count, min(1.0, (self.top + rows - 1) / self.count))
+        else:
+            self.scrollbar.set(0.0, 1.0)
+
+    # --- Tapahtumat ---
+
+    def _on_click(self, event):
+        self.canvas.focus_set()
+        i = self.top + event.y // self.row_height
+        if i < self.count:
+            self.selected = i
+            self.redraw()
+            self.event_generate("<<ListboxSelect>>")
+
+    def _step(self, n):
+        if not self.count:
+            return
+        i = 0 if self.selected is None else self.selected + n
+        self.select(max(0, min(i, self.count - 1)))
+        self.event_generate("<<ListboxSelect>>")
@@ -0,0 +1,274 @@
+# zstseek.py -- hajasaanti .zst-arkiston purettuun sisältöön
+#
+# zstd-frame voidaan purkaa itsenäisesti, joten monen framen arkistossa purku
+# aloitetaan lähimmästä framesta ennen haluttua kohtaa. Framien alut
+# (pakattu offset, purettu offset) kerätään indeksiä rakennettaessa.
+#
+# Yhden framen arkistossa purkua ei voi aloittaa keskeltä (dekooderin tila ja
+# ikkuna eivät ole tallennettavissa), joten lukija pitää purkukohdan auki ja
+# jatkaa siitä eteenpäin. Taaksepäin hypätessä purku alkaa framen alusta.
+# make_seekable() pakkaa tällaisen arkiston uudelleen pieniksi frameiksi
+# (komentoriviltä: python pgncli.py seekable lichess.pgn.zst lichess.seek.zst).
+#
+# Framelista voi kasvaa lukijan käytön aikana (indeksiä rakennetaan vielä),
+# joten lukija päivittää framien alkukohdat aina, kun listan pituus muuttuu.
+#
+# Monen framen arkiston framet löydetään lohkojen otsakkeista purkamatta
+# (scan_frames), ja ne puretaan rinnakkain säiepoolissa: zstandard vapauttaa
+# GIL:n purun ja pakkauksen ajaksi. Muistia rajoitetaan framien purettujen
+# kokojen mukaan (frame-otsakkeen content size): keskeneräisiä framejä on
+# enintään PARALLEL_MAX_PENDING tavun verran, ja jos jonkin framen purettu
+# koko on tuntematon tai yli PARALLEL_MAX_FRAME, arkisto puretaan virtana.
+# Samoin write_seekable() pakkaa framet rinnakkain.
+
+import os, struct, threading
+from bisect import bisect_right
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import zstandard as zstd
+
+READ_SIZE = 1024 * 1024        # 1 MB
+FRAME_SIZE = 4 * 1024 * 1024   # purettua dataa per frame make_seekable():ssa
+PARALLEL_MAX_FRAME = 64 * 1024 * 1024     # purettu koko; suuremmat framet puretaan virtana
+PARALLEL_MAX_PENDING = 256 * 1024 * 1024  # purettuja tavuja enintään kesken kerralla
+
+_ZSTD_MAGIC = 0xFD2FB528
+_SKIPPABLE_MAGIC = 0x184D2A50   # ...0x184D2A5F
+
+
+def iter_zst_chunks(f, frames=None, read_size=READ_SIZE, start=(0, 0)):
+    """
+    Purkaa .zst-tiedoston kaikki framet peräkkäin ja palauttaa puretut palat.
+    Jos frames on lista, jokaisen framen alku kirjataan siihen muodossa
+    (pakattu offset, purettu offset). start kertoo, mistä kohdasta tiedostoa f
+    on valmiiksi kelattu.
+    """
+    dctx = zstd.ZstdDecompressor()
+    comp_pos, decomp_pos = start
+    data = f.read(read_size)
+    while data:
+        obj = dctx.decompressobj()
+        if frames is not None:
+            frames.append((comp_pos, decomp_pos))
+        while True:
+            out = obj.decompress(data)
+            if out:
+                decomp_pos += len(out)
+                yield out
+            if obj.eof:
+                rest = obj.unused_data
+                comp_pos += len(data) - len(rest)
+                data = rest or f.read(read_size)
+                break
+            comp_pos += len(data)
+            data = f.read(read_size)
+            if not data:
+                return
+
+
+def scan_frames(f):
+    """
+    Etsii tiedoston zstd-framet lukemalla vain frame- ja lohko-otsakkeet.
+    Palauttaa listan (pakattu offset, pakattu koko, purettu koko); purettu koko
+    on -1, jos sitä ei ole otsakkeessa. Ohitettavat framet jätetään pois.
+    """
+    frames = []
+    size = os.fstat(f.fileno()).st_size
+    pos = 0
+    while pos < size:
+        f.seek(pos)
+        head = f.read(18)
+        if len(head) < 8:
+            raise zstd.ZstdError("katkennut zstd-frame")
+        magic, skip = struct.unpack_from("<II", head)
+        if magic & 0xFFFFFFF0 == _SKIPPABLE_MAGIC:
+            pos += 8 + skip
+            continue
+        if magic != _ZSTD_MAGIC:
+            raise zstd.ZstdError(f"ei zstd-framea kohdassa {pos}")
+        params = zstd.get_frame_parameters(head)
+        checksum = params.has_checksum
+        content_size = params.content_size if params.content_size != zstd.CONTENTSIZE_UNKNOWN else -1
+        block = pos + zstd.frame_header_size(head)
+        while True:
+            f.seek(block)
+            raw = f.read(3)
+            if len(raw) < 3:
+                raise zstd.ZstdError("katkennut zstd-frame")
+            header = int.from_bytes(raw, "little")
+            kind, length = (header >> 1) & 3, header >> 3
+            block += 3 + (1 if kind == 1 else length)   # RLE-lohkossa on yksi tavu
+            if header & 1:
+                break
+        end = block + (4 if checksum else 0)
+        frames.append((pos, end - pos, content_size))
+        pos = end
+    return frames
+
+
+def _decompress_frame(fd, offset, size):
+    data = os.pread(fd, size, offset)
+    return zstd.ZstdDecompressor().decompressobj().decompress(data)
+
+
+def iter_zst_frames(path, frames=None, threads=None, read_size=READ_SIZE):
+    """
+    Purkaa .zst-tiedoston ja palauttaa (luettu pakattu offset, purettu pala).
+    Monen framen arkistossa framet puretaan rinnakkain threads säikeellä
+    (järjestys säilyy, muisti rajattu puretun koon mukaan). frames-listaan kirjataan framejen alut kuten
+    iter_zst_chunks():ssa.
+    """
+    threads = threads or os.cpu_count() or 1
+    with open(path, "rb") as f:
+        try:
+            spans = scan_frames(f)
+        except zstd.ZstdError:
+            spans = []
+        f.seek(0)
+        if (threads == 1 or len(spans) < 2
+                or any(not 0 <= content <= PARALLEL_MAX_FRAME for _, _, content in spans)):
+            for chunk in iter_zst_chunks(f, frames, read_size):
+                yield f.tell(), chunk
+            return
+
+        decomp_pos = 0
+        with ThreadPoolExecutor(threads) as pool:
+            pending = deque()
+            pending_bytes = 0
+            spans = deque(spans)
+            while True:
+                while spans and len(pending) < threads * 2 and (
+                        not pending or pending_bytes + spans[0][2] <= PARALLEL_MAX_PENDING):
+                    offset, size, content = spans.popleft()
+                    pending.append((offset, size, content, pool.submit(_decompress_frame, f.fileno(), offset, size)))
+                    pending_bytes += content
+                if not pending:
+                    break
+                offset, size, content, future = pending.popleft()
+                pending_bytes -= content
+                data = future.result()
+                if frames is not None:
+                    frames.append((offset, decomp_pos))
+                decomp_pos += len(data)
+                yield offset + size, data
+
+
+class ZstSeekableReader:
+    """Lukee tavualueita .zst-arkiston puretusta sisällöstä framelistan avulla"""
+
+    def __init__(self, path, frames):
+        self.path = path
+        self.frames = frames if frames is not None else []   # sama lista kuin indeksissä
+        self._starts = []
+        self._lock = threading.Lock()
+        self._f = None
+        self._chunks = None
+        self._pos = 0      # self._buf:n alun purettu offset
+        self._buf = b""
+
+    def _sync_frames(self):
+        if len(self._starts) != max(len(self.frames), 1):
+            self._starts = [decomp for _, decomp in self.frames] or [0]
+
+    def _restart(self, offset):
+        k = max(bisect_right(self._starts, offset) - 1, 0)
+        comp, decomp = self.frames[k] if self.frames else (0, 0)
+        if self._f is None:
+            self._f = open(self.path, "rb")
+        self._f.seek(comp)
+        self._chunks = iter_zst_chunks(self._f, start=(comp, decomp))
+        self._pos = decomp
+        self._buf = b""
+
+    def _needs_restart(self, offset):
+        if self._chunks is None or offset < self._pos:
+            return True
+        # Jos kohde on myöhemmässä framessa, hypätään suoraan sen alkuun
+        k = bisect_right(self._starts, offset) - 1
+        return self._starts[k] > self._pos + len(self._buf)
+
+    def read(self, offset, length):
+        """Palauttaa length tavua puretusta datasta kohdasta offset"""
+        with self._lock:
+            self._sync_frames()
+            if self._needs_restart(offset):
+                self._restart(offset)
+            out = bytearray()
+            while len(out) < length:
+                lo = offset + len(out) - self._pos
+                if lo < len(self._buf):
+                    out += self._buf[lo:lo + length - len(out)]
+                    continue
+                chunk = next(self._chunks, None)
+                if chunk is None:
+                    break
+                self._pos += len(self._buf)
+                self._buf = chunk
+            return bytes(out)
+
+    def close(self):
+        with self._lock:
+            if self._f is not None:
+                self._f.close()
+            self._f = None
+            self._chunks = None
+
+
+def write_seekable(chunks, dst, frame_size=FRAME_SIZE, level=3, threads=None):
+    """
+    Pakkaa tavupalat tiedostoon dst itsenäisiksi frameiksi, jotka alkavat
+    pelin alusta. Framet pakataan rinnakkain threads säikeellä.
+    Palauttaa framelistan [(pakattu offset, purettu offset), ...].
+    """
+    threads = threads or os.cpu_count() or 1
+    local = threading.local()
+    frames = []
+    comp_pos = decomp_pos = 0
+    pending = deque()
+
+    def compress(data):
+        cctx = getattr(local, "cctx", None)
+        if cctx is None:
+            cctx = local.cctx = zstd.ZstdCompressor(level=level)
+        return cctx.compress(data)
+
+    def write_done(out, keep):
+        nonlocal comp_pos, decomp_pos
+        while len(pending) > keep:
+            length, future = pending.popleft()
+            frame = future.result()
+            frames.append((comp_pos, decomp_pos))
+            out.write(frame)
+            comp_pos += len(frame)
+            decomp_pos += length
+
+    with open(dst, "wb") as out, ThreadPoolExecutor(threads) as pool:
+        buf = bytearray()
+        for chunk in chunks:
+            buf += chunk
+            while len(buf) >= frame_size:
+                # Katkaistaan seuraavan pelin alusta, jotta peli ei jakaudu kahteen frameen
+                cut = buf.find(b"\n[Event ", frame_size)
+                if cut < 0:
+                    break
+                data = bytes(buf[:cut + 1])
+                del buf[:cut + 1]
+                pending.append((len(data), pool.submit(compress, data)))
+                write_done(out, threads * 2)
+        if buf:
+            pending.append((len(buf), pool.submit(compress, bytes(buf))))
+        write_done(out, 0)
+    return frames
+
+
+def make_seekable(src, dst, frame_size=FRAME_SIZE, level=3, threads=None):
+    """
+    Pakkaa .zst- tai .pgn-tiedoston uudelleen itsenäisiksi frameiksi niin,
+    että framet alkavat pelin alusta. Palauttaa framelistan.
+    """
+    if src.endswith(".zst"):
+        chunks = (chunk for _, chunk in iter_zst_frames(src, threads=threads))
+        return write_seekable(chunks, dst, frame_size, level, threads)
+    with open(src, "rb") as f:
+        return write_seekable(iter(lambda: f.read(READ_SIZE), b""), dst, frame_size, level, threads)